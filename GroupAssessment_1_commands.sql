@@ -10,6 +10,9 @@ PRAGMA foreign_keys = ON;
 
 -- 2. DROP TABLES (Cleanup for fresh installation)
 -- We drop in reverse order of dependencies
+DROP TABLE IF EXISTS ChangeLog;
+DROP TABLE IF EXISTS AuditArchives;
+DROP TABLE IF EXISTS AuditCheckpoints;
 DROP TABLE IF EXISTS AuditLogs;
 DROP TABLE IF EXISTS LabResults;
 DROP TABLE IF EXISTS Prescriptions;
@@ -164,9 +167,130 @@ CREATE TABLE AuditLogs (
     table_name TEXT,
     timestamp  TEXT NOT NULL DEFAULT (datetime('now')),
     details    TEXT,
+    prev_hash  TEXT,                       -- row_hash of the previous log entry
+    row_hash   TEXT,                       -- SHA-256 over prev_hash + this row
+    patient_id INTEGER,                    -- patient the event concerns, if any
     FOREIGN KEY (user_id) REFERENCES Users(user_id)
 );
 
+CREATE INDEX idx_audit_patient ON AuditLogs(patient_id, action);
+
+-- Signed chain heads (HMAC-SHA256), written by the middleware every N rows
+CREATE TABLE AuditCheckpoints (
+    checkpoint_id INTEGER PRIMARY KEY,
+    last_log_id   INTEGER NOT NULL UNIQUE,
+    row_hash      TEXT NOT NULL,
+    signature     TEXT NOT NULL,
+    created_at    TEXT NOT NULL DEFAULT (datetime('now'))
+);
+
+-- Append-only enforcement
+CREATE TRIGGER audit_no_update BEFORE UPDATE ON AuditLogs
+BEGIN SELECT RAISE(ABORT, 'AuditLogs is append-only'); END;
+
+-- Monthly archive files holding audit rows moved out of the hot table
+CREATE TABLE AuditArchives (
+    month         TEXT PRIMARY KEY,   -- YYYY-MM
+    file_path     TEXT NOT NULL,
+    first_log_id  INTEGER NOT NULL,
+    last_log_id   INTEGER NOT NULL,
+    last_row_hash TEXT NOT NULL,
+    row_count     INTEGER NOT NULL
+);
+
+-- Only rows already copied into an archive may leave the hot table
+CREATE TRIGGER audit_no_delete BEFORE DELETE ON AuditLogs
+WHEN OLD.log_id > (SELECT COALESCE(MAX(last_log_id), 0) FROM AuditArchives)
+BEGIN SELECT RAISE(ABORT, 'AuditLogs is append-only'); END;
+
+-- F. CHANGE NOTIFICATION
+-- One row per write to a watched table, from any process or tool; middleware
+-- processes poll it to keep their caches and sessions coherent (change_bus.py)
+CREATE TABLE ChangeLog (
+    seq        INTEGER PRIMARY KEY AUTOINCREMENT,   -- never reused after pruning
+    table_name TEXT NOT NULL,
+    row_key    INTEGER,
+    op         TEXT NOT NULL CHECK (op IN ('I','U','D')),
+    changed_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+
+-- Users, keyed by user_id
+CREATE TRIGGER changelog_Users_I AFTER INSERT ON Users
+BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('Users', NEW.user_id, 'I'); END;
+CREATE TRIGGER changelog_Users_U AFTER UPDATE ON Users
+BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('Users', NEW.user_id, 'U'); END;
+CREATE TRIGGER changelog_Users_D AFTER DELETE ON Users
+BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('Users', OLD.user_id, 'D'); END;
+CREATE TRIGGER changelog_Users_M AFTER UPDATE ON Users
+WHEN OLD.user_id IS NOT NEW.user_id   -- a row moved to another key changes the old key too
+BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('Users', OLD.user_id, 'U'); END;
+
+-- UserRoles, keyed by user_id
+CREATE TRIGGER changelog_UserRoles_I AFTER INSERT ON UserRoles
+BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('UserRoles', NEW.user_id, 'I'); END;
+CREATE TRIGGER changelog_UserRoles_U AFTER UPDATE ON UserRoles
+BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('UserRoles', NEW.user_id, 'U'); END;
+CREATE TRIGGER changelog_UserRoles_D AFTER DELETE ON UserRoles
+BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('UserRoles', OLD.user_id, 'D'); END;
+CREATE TRIGGER changelog_UserRoles_M AFTER UPDATE ON UserRoles
+WHEN OLD.user_id IS NOT NEW.user_id   -- a row moved to another key changes the old key too
+BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('UserRoles', OLD.user_id, 'U'); END;
+
+-- Roles, keyed by role_id
+CREATE TRIGGER changelog_Roles_I AFTER INSERT ON Roles
+BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('Roles', NEW.role_id, 'I'); END;
+CREATE TRIGGER changelog_Roles_U AFTER UPDATE ON Roles
+BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('Roles', NEW.role_id, 'U'); END;
+CREATE TRIGGER changelog_Roles_D AFTER DELETE ON Roles
+BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('Roles', OLD.role_id, 'D'); END;
+CREATE TRIGGER changelog_Roles_M AFTER UPDATE ON Roles
+WHEN OLD.role_id IS NOT NEW.role_id   -- a row moved to another key changes the old key too
+BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('Roles', OLD.role_id, 'U'); END;
+
+-- Patients, keyed by patient_id
+CREATE TRIGGER changelog_Patients_I AFTER INSERT ON Patients
+BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('Patients', NEW.patient_id, 'I'); END;
+CREATE TRIGGER changelog_Patients_U AFTER UPDATE ON Patients
+BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('Patients', NEW.patient_id, 'U'); END;
+CREATE TRIGGER changelog_Patients_D AFTER DELETE ON Patients
+BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('Patients', OLD.patient_id, 'D'); END;
+CREATE TRIGGER changelog_Patients_M AFTER UPDATE ON Patients
+WHEN OLD.patient_id IS NOT NEW.patient_id   -- a row moved to another key changes the old key too
+BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('Patients', OLD.patient_id, 'U'); END;
+
+-- Treatments, keyed by patient_id
+CREATE TRIGGER changelog_Treatments_I AFTER INSERT ON Treatments
+BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('Treatments', NEW.patient_id, 'I'); END;
+CREATE TRIGGER changelog_Treatments_U AFTER UPDATE ON Treatments
+BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('Treatments', NEW.patient_id, 'U'); END;
+CREATE TRIGGER changelog_Treatments_D AFTER DELETE ON Treatments
+BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('Treatments', OLD.patient_id, 'D'); END;
+CREATE TRIGGER changelog_Treatments_M AFTER UPDATE ON Treatments
+WHEN OLD.patient_id IS NOT NEW.patient_id   -- a row moved to another key changes the old key too
+BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('Treatments', OLD.patient_id, 'U'); END;
+
+-- Prescriptions, keyed by patient_id
+CREATE TRIGGER changelog_Prescriptions_I AFTER INSERT ON Prescriptions
+BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('Prescriptions', NEW.patient_id, 'I'); END;
+CREATE TRIGGER changelog_Prescriptions_U AFTER UPDATE ON Prescriptions
+BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('Prescriptions', NEW.patient_id, 'U'); END;
+CREATE TRIGGER changelog_Prescriptions_D AFTER DELETE ON Prescriptions
+BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('Prescriptions', OLD.patient_id, 'D'); END;
+CREATE TRIGGER changelog_Prescriptions_M AFTER UPDATE ON Prescriptions
+WHEN OLD.patient_id IS NOT NEW.patient_id   -- a row moved to another key changes the old key too
+BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('Prescriptions', OLD.patient_id, 'U'); END;
+
+-- LabResults, keyed by patient_id
+CREATE TRIGGER changelog_LabResults_I AFTER INSERT ON LabResults
+BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('LabResults', NEW.patient_id, 'I'); END;
+CREATE TRIGGER changelog_LabResults_U AFTER UPDATE ON LabResults
+BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('LabResults', NEW.patient_id, 'U'); END;
+CREATE TRIGGER changelog_LabResults_D AFTER DELETE ON LabResults
+BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('LabResults', OLD.patient_id, 'D'); END;
+CREATE TRIGGER changelog_LabResults_M AFTER UPDATE ON LabResults
+WHEN OLD.patient_id IS NOT NEW.patient_id   -- a row moved to another key changes the old key too
+BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('LabResults', OLD.patient_id, 'U'); END;
+
 -- ==========================================================
 -- 4. INITIAL DATA POPULATION (Team Members)
 -- ==========================================================
@@ -0,0 +1,276 @@
+import os
+import sys
+import time
+import heapq
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+from hospital_core import (
+    DB_PATH, read_connection, readonly_uri, write_transaction, ensure_audit_schema, get_user_credentials
+)
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# Rows older than HOT_DAYS move out of the live database into one archive
+# file per month. Each step copies and deletes at most ARCHIVE_BATCH_SIZE rows,
+# so the writer lock is only ever held for a short DELETE.
+ARCHIVE_DIR = 'audit_archive'
+HOT_DAYS = 30
+ARCHIVE_BATCH_SIZE = 500
+ARCHIVE_PAUSE = 0.05          # seconds between batches, lets the middleware in
+ARCHIVE_INTERVAL = 3600       # seconds between background archival runs
+
+AUDIT_COLUMNS = "log_id, user_id, action, table_name, timestamp, details, prev_hash, row_hash, patient_id"
+
+
+def authorize_etl(username):
+    ctx = get_user_credentials(username)
+    return ctx and ctx['role_name'] == 'etl_service'
+
+
+def archive_dir(db_path=DB_PATH):
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), ARCHIVE_DIR)
+
+
+def archive_path(month):
+    """Absolute path of a month's archive file, so AuditArchives does not depend on the cwd."""
+    return os.path.join(archive_dir(), f"audit_{month.replace('-', '_')}.db")
+
+
+def open_readonly(path=DB_PATH):
+    conn = sqlite3.connect(readonly_uri(path), uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def open_archive(path):
+    """Open (creating if needed) a monthly archive file for writing."""
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS AuditLogs (
+            log_id     INTEGER PRIMARY KEY,
+            user_id    INTEGER,
+            action     TEXT NOT NULL,
+            table_name TEXT,
+            timestamp  TEXT NOT NULL,
+            details    TEXT,
+            prev_hash  TEXT,
+            row_hash   TEXT,
+            patient_id INTEGER
+        )
+    """)
+    if 'patient_id' not in [r[1] for r in conn.execute("PRAGMA table_info(AuditLogs)")]:
+        conn.execute("ALTER TABLE AuditLogs ADD COLUMN patient_id INTEGER")   # file from before the column
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_timestamp ON AuditLogs(timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_patient ON AuditLogs(patient_id, action)")
+    conn.commit()
+    return conn
+
+
+# ==========================================
+# INCREMENTAL ARCHIVAL
+# ==========================================
+
+def _next_cold_batch(cutoff, batch_size):
+    """Oldest hot rows (in log_id order) older than the cutoff."""
+    with read_connection() as conn:
+        rows = conn.execute(f"""
+            SELECT {AUDIT_COLUMNS} FROM AuditLogs
+            WHERE log_id > (SELECT COALESCE(MAX(last_log_id), 0) FROM AuditArchives)
+            ORDER BY log_id LIMIT ?
+        """, (batch_size,)).fetchall()
+
+    # Archived ranges must stay contiguous, so stop at the first warm row
+    batch = []
+    for r in rows:
+        if r['timestamp'] >= cutoff or r['row_hash'] is None:
+            break
+        batch.append(tuple(r))
+    return batch
+
+
+def archive_batch(rows):
+    """Copy one batch into its monthly archive files, then drop it from the hot table.
+    The copy is INSERT OR IGNORE, so a crash between the two steps is safe to re-run.
+    Returns the number of rows moved: 0 if another archiver moved the batch first."""
+    by_month = {}
+    for row in rows:
+        by_month.setdefault(row[4][:7], []).append(row)
+
+    os.makedirs(archive_dir(), exist_ok=True)
+    for month, month_rows in by_month.items():
+        conn = open_archive(archive_path(month))
+        with conn:
+            conn.executemany(f"INSERT OR IGNORE INTO AuditLogs ({AUDIT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             month_rows)
+        conn.close()
+
+    with write_transaction() as conn:
+        # The batch was read outside the writer lock; every middleware process runs an
+        # archiver, so make sure nobody archived these rows in the meantime
+        archived_through = conn.execute(
+            "SELECT COALESCE(MAX(last_log_id), 0) FROM AuditArchives").fetchone()[0]
+        if archived_through >= rows[0][0]:
+            return 0
+        for month, month_rows in by_month.items():
+            conn.execute("""
+                INSERT INTO AuditArchives (month, file_path, first_log_id, last_log_id, last_row_hash, row_count)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(month) DO UPDATE SET
+                    first_log_id  = MIN(first_log_id, excluded.first_log_id),
+                    last_log_id   = MAX(last_log_id, excluded.last_log_id),
+                    last_row_hash = CASE WHEN excluded.last_log_id > last_log_id
+                                         THEN excluded.last_row_hash ELSE last_row_hash END,
+                    row_count     = row_count + excluded.row_count
+            """, (month, archive_path(month), month_rows[0][0], month_rows[-1][0],
+                  month_rows[-1][7], len(month_rows)))
+        conn.execute("DELETE FROM AuditLogs WHERE log_id BETWEEN ? AND ?", (rows[0][0], rows[-1][0]))
+    return len(rows)
+
+
+def archive_cold_rows(hot_days=HOT_DAYS, batch_size=ARCHIVE_BATCH_SIZE, max_batches=None):
+    """Move every row older than `hot_days` into the monthly archives, one small batch at a time.
+    Returns the number of rows archived."""
+    ensure_audit_schema()
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=hot_days)).strftime("%Y-%m-%d %H:%M:%S")
+    moved = batches = 0
+    while max_batches is None or batches < max_batches:
+        rows = _next_cold_batch(cutoff, batch_size)
+        if not rows:
+            break
+        moved += archive_batch(rows)
+        batches += 1
+        time.sleep(ARCHIVE_PAUSE)
+    return moved
+
+
+def start_archiver(interval=ARCHIVE_INTERVAL):
+    """Run archival periodically in a daemon thread next to the middleware."""
+    def loop():
+        while True:
+            try:
+                moved = archive_cold_rows()
+                if moved:
+                    print(f"[ARCHIVE] Moved {moved} audit rows to {archive_dir()}/")
+            except Exception as e:
+                print(f"[ARCHIVE ERROR] {e}")
+            time.sleep(interval)
+    threading.Thread(target=loop, daemon=True).start()
+
+
+# ==========================================
+# UNIFIED QUERY API (HOT + ARCHIVES)
+# ==========================================
+
+def list_archives(conn):
+    """AuditArchives rows (empty if archival has never run)."""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'AuditArchives'").fetchone():
+        return []
+    return conn.execute("SELECT * FROM AuditArchives ORDER BY first_log_id").fetchall()
+
+
+def select_columns(conn):
+    """AUDIT_COLUMNS for this file, with NULL standing in for columns an older
+    database or archive does not have yet; reads never migrate."""
+    have = {r[1] for r in conn.execute("PRAGMA table_info(AuditLogs)")}
+    return ", ".join(c if c in have else f"NULL AS {c}" for c in AUDIT_COLUMNS.split(", "))
+
+
+def _select(conn, where, params):
+    return conn.execute(f"SELECT {select_columns(conn)} FROM AuditLogs WHERE {where} ORDER BY log_id", params)
+
+
+def _archive_file(archive, db_path):
+    """Resolve an AuditArchives file_path. Older rows hold paths relative to the
+    database directory; a missing file is an error, not an empty month."""
+    path = archive['file_path']
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(os.path.abspath(db_path)), path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Audit archive for {archive['month']} is missing: {path} "
+                                f"(log_id {archive['first_log_id']}..{archive['last_log_id']})")
+    return path
+
+
+def _merge(conn, archives, where, params, db_path=DB_PATH):
+    """Run the same query against each needed archive and the hot table, merged by log_id."""
+    sources = []
+    archive_conns = []
+    try:
+        for a in archives:
+            ac = open_readonly(_archive_file(a, db_path))
+            archive_conns.append(ac)
+            sources.append(_select(ac, where, params))
+        sources.append(_select(conn, where, params))
+        yield from heapq.merge(*sources, key=lambda r: r['log_id'])
+    finally:
+        for ac in archive_conns:
+            ac.close()
+
+
+def query_audit_range(start=None, end=None, where="1=1", params=(), db_path=DB_PATH):
+    """Yield audit rows with start <= timestamp < end from the hot table and only the
+    monthly archives overlapping that range. `where`/`params` add further filters."""
+    clauses, args = [f"({where})"], list(params)
+    if start:
+        clauses.append("timestamp >= ?")
+        args.append(start)
+    if end:
+        clauses.append("timestamp < ?")
+        args.append(end)
+
+    conn = open_readonly(db_path)
+    try:
+        archives = [a for a in list_archives(conn)
+                    if (not start or a['month'] >= start[:7]) and (not end or a['month'] <= end[:7])]
+        yield from _merge(conn, archives, " AND ".join(clauses), args, db_path)
+    finally:
+        conn.close()
+
+
+def count_by_user(db_path=DB_PATH):
+    """{user_id: audit rows} over the hot table and every archive, one GROUP BY per file."""
+    counts = {}
+
+    def add(source):
+        for user_id, n in source.execute(
+                "SELECT user_id, COUNT(*) FROM AuditLogs WHERE user_id IS NOT NULL GROUP BY user_id"):
+            counts[user_id] = counts.get(user_id, 0) + n
+
+    conn = open_readonly(db_path)
+    try:
+        for a in list_archives(conn):
+            ac = open_readonly(_archive_file(a, db_path))
+            try:
+                add(ac)
+            finally:
+                ac.close()
+        add(conn)
+    finally:
+        conn.close()
+    return counts
+
+
+def fetch_audit_rows(after_id, through_id, db_path=DB_PATH):
+    """Yield rows with after_id < log_id <= through_id wherever they are stored."""
+    conn = open_readonly(db_path)
+    try:
+        archives = [a for a in list_archives(conn)
+                    if a['last_log_id'] > after_id and a['first_log_id'] <= through_id]
+        yield from _merge(conn, archives, "log_id > ? AND log_id <= ?", (after_id, through_id), db_path)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    username = input("ETL username: ")
+
+    if not authorize_etl(username):
+        print("ACCESS DENIED: Only etl_service may archive audit logs.")
+        sys.exit(1)
+
+    print(f"[*] Archiving audit rows older than {HOT_DAYS} days...")
+    moved = archive_cold_rows()
+    print(f"[+] Archived {moved} rows into {archive_dir()}/")
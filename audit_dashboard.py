@@ -1,46 +1,53 @@
-import sqlite3
+from collections import Counter
 
-DB_PATH = 'hospital_mc.db'  # Path DB file
+from hospital_core import read_connection, get_user_credentials
+from audit_archive import count_by_user
 
+DB_PATH = 'hospital_mc.db'  # Path DB file
 
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
 
 def authorize_audit(username):
-    from hospital_middleware import get_user_credentials
     ctx = get_user_credentials(username)
     return ctx and ctx['role_name'] in ('etl_service', 'auditor')
 
 
 
+def role_summary(cursor):
+    """Audit actions per role across the hot table and every archive, as (role, count)."""
+    per_user = count_by_user(DB_PATH)
+    cursor.execute("""
+        SELECT ur.user_id, r.name
+        FROM UserRoles ur
+        JOIN Roles r ON ur.role_id = r.role_id
+    """)
+    per_role = Counter()
+    for user_id, role in cursor.fetchall():
+        if user_id in per_user:
+            per_role[role] += per_user[user_id]
+    return sorted(per_role.items())
+
+
 def run_dashboard():
-    conn = get_db()
-    cursor = conn.cursor()
-    
+    # Dashboard scans only read, so they go through the read-only pool
+    with read_connection() as conn:
+        print_dashboard(conn.cursor())
+
+
+def print_dashboard(cursor):    
     print("\n" + "="*60)
     print("      HOSPITAL SYSTEM - SECURITY AUDIT DASHBOARD      ")
     print("="*60)
     
-    # 1. SUMMARY STATISTICS
+    # 1. SUMMARY STATISTICS (hot table and monthly archives)
     print("\n[1] ACCESS SUMMARY BY ROLE")
-    cursor.execute("""
-        SELECT r.name as Role, COUNT(l.log_id) as ActionCount
-        FROM AuditLogs l
-        JOIN Users u ON l.user_id = u.user_id
-        JOIN UserRoles ur ON u.user_id = ur.user_id
-        JOIN Roles r ON ur.role_id = r.role_id
-        GROUP BY r.name
-    """)
-    rows = cursor.fetchall()
+    rows = role_summary(cursor)
     
     # Header
     print(f"{'Role':<15} | {'Count':<10}")
     print("-" * 30)
     # Rows
-    for r in rows:
-        print(f"{r['Role']:<15} | {r['ActionCount']:<10}")
+    for role, count in rows:
+        print(f"{role:<15} | {count:<10}")
 
     # 2. SECURITY ALERTS
     print("\n[2] RECENT SECURITY ALERTS (Violations & Failures)")
@@ -64,8 +71,10 @@ def run_dashboard():
 
     # 3. CLINICAL ACCESS LOG
     print("\n[3] RECENT CLINICAL DATA ACCESS")
-    cursor.execute("""
-        SELECT u.username, l.action, l.details, l.timestamp
+    cols = [r[1] for r in cursor.execute("PRAGMA table_info(AuditLogs)")]
+    patient_col = "l.patient_id" if 'patient_id' in cols else "NULL AS patient_id"   # not migrated yet
+    cursor.execute(f"""
+        SELECT u.username, l.action, l.details, {patient_col}, l.timestamp
         FROM AuditLogs l
         JOIN Users u ON l.user_id = u.user_id
         WHERE l.action LIKE 'READ%'
@@ -79,10 +88,10 @@ def run_dashboard():
     else:
         for r in rows:
             # Slicing timestamp [11:19] gives us just the HH:MM:SS time
-            print(f"[{r['timestamp'][11:19]}] {r['username']} performed {r['action']}: {r['details']}")
+            patient = f" (patient {r['patient_id']})" if r['patient_id'] is not None else ""
+            print(f"[{r['timestamp'][11:19]}] {r['username']} performed {r['action']}: {r['details']}{patient}")
 
     print("\n" + "="*60)
-    conn.close()
 
 if __name__ == "__main__":
     username = input("Audit username: ")
@@ -90,5 +99,4 @@ if __name__ == "__main__":
     if not authorize_audit(username):
         print("ACCESS DENIED: Only auditor or etl_service may run dashboard.")
         exit()
-
     run_dashboard()
@@ -0,0 +1,114 @@
+import sys
+import time
+import hmac
+from concurrent.futures import ProcessPoolExecutor
+
+from hospital_core import (
+    DB_PATH, AUDIT_GENESIS_HASH, audit_row_hash, sign_checkpoint, get_user_credentials
+)
+from audit_archive import open_readonly, fetch_audit_rows, list_archives
+
+# CONFIGURATION
+MAX_WORKERS = None   # default: one per CPU
+
+
+def authorize_audit(username):
+    ctx = get_user_credentials(username)
+    return ctx and ctx['role_name'] in ('etl_service', 'auditor')
+
+
+# ==========================================
+# SEGMENT VERIFICATION (runs in worker processes)
+# ==========================================
+
+def verify_segment(segment):
+    """Re-hash rows in (after_id, through_id] starting from a trusted hash.
+    Rows are read from the hot table and any monthly archive covering the range.
+    Returns (after_id, through_id, rows_checked, error or None)."""
+    db_path, after_id, through_id, start_hash, expected_end = segment
+
+    prev = start_hash
+    checked = 0
+    try:
+        for r in fetch_audit_rows(after_id, through_id, db_path):
+            if r['prev_hash'] != prev:
+                return after_id, through_id, checked, f"Chain broken at log_id {r['log_id']} (row missing or inserted before it)"
+            computed = audit_row_hash(prev, r['log_id'], r['user_id'], r['action'],
+                                      r['table_name'], r['timestamp'], r['details'], r['patient_id'])
+            if computed != r['row_hash']:
+                return after_id, through_id, checked, f"Hash mismatch at log_id {r['log_id']} (row modified)"
+            prev = r['row_hash']
+            checked += 1
+    except FileNotFoundError as e:
+        return after_id, through_id, checked, str(e)
+
+    if expected_end is not None and prev != expected_end:
+        return after_id, through_id, checked, f"Checkpoint at log_id {through_id} does not match chain (rows deleted)"
+    return after_id, through_id, checked, None
+
+
+# ==========================================
+# VERIFICATION DRIVER
+# ==========================================
+
+def build_segments(conn, db_path):
+    """Split the chain at checkpoints. Returns (segments, checkpoint errors)."""
+    errors = []
+    boundaries = [(0, AUDIT_GENESIS_HASH)]
+    for cp in conn.execute("SELECT last_log_id, row_hash, signature FROM AuditCheckpoints ORDER BY last_log_id"):
+        expected = sign_checkpoint(cp['last_log_id'], cp['row_hash'])
+        if not hmac.compare_digest(expected, cp['signature']):
+            errors.append(f"Invalid signature on checkpoint at log_id {cp['last_log_id']}")
+            continue
+        boundaries.append((cp['last_log_id'], cp['row_hash']))
+
+    segments = []
+    for (start_id, start_hash), (end_id, end_hash) in zip(boundaries, boundaries[1:]):
+        segments.append((db_path, start_id, end_id, start_hash, end_hash))
+
+    # Rows after the newest checkpoint have no signed end point yet
+    hot_max = conn.execute("SELECT COALESCE(MAX(log_id), 0) FROM AuditLogs").fetchone()[0]
+    max_id = max([hot_max] + [a['last_log_id'] for a in list_archives(conn)])
+    last_id, last_hash = boundaries[-1]
+    if max_id > last_id:
+        segments.append((db_path, last_id, max_id, last_hash, None))
+    return segments, errors
+
+
+def verify_chain(db_path=DB_PATH, max_workers=MAX_WORKERS):
+    """Verify the whole audit chain. Returns (rows_checked, list of errors)."""
+    conn = open_readonly(db_path)
+    cols = [r[1] for r in conn.execute("PRAGMA table_info(AuditLogs)")]
+    if 'row_hash' not in cols or 'patient_id' not in cols:
+        conn.close()
+        return 0, ["AuditLogs has not been upgraded yet (no audit row written since upgrade)."]
+    segments, errors = build_segments(conn, db_path)
+    conn.close()
+
+    checked = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        for after_id, through_id, count, error in pool.map(verify_segment, segments, chunksize=8):
+            checked += count
+            if error:
+                errors.append(error)
+    return checked, errors
+
+
+if __name__ == "__main__":
+    username = input("Audit username: ")
+
+    if not authorize_audit(username):
+        print("ACCESS DENIED: Only auditor or etl_service may verify the audit log.")
+        sys.exit(1)
+
+    print("[*] Verifying audit chain...")
+    start = time.perf_counter()
+    checked, errors = verify_chain()
+    elapsed = time.perf_counter() - start
+
+    if errors:
+        print(f"[-] AUDIT CHAIN COMPROMISED ({checked} rows checked in {elapsed:.2f}s)")
+        for e in errors:
+            print(f"    - {e}")
+        sys.exit(2)
+    print(f"[+] Audit chain intact: {checked} rows verified in {elapsed:.2f}s")
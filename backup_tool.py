@@ -3,12 +3,13 @@ import os
 import time
 from datetime import datetime
 
+from hospital_core import get_user_credentials, readonly_uri
+
 # CONFIGURATION
-SOURCE_DB = 'hospital.db'
+SOURCE_DB = 'hospital_mc.db'
 BACKUP_DIR = 'backups'
 
 def authorize_etl(username):
-    from hospital_middleware import get_user_credentials
     ctx = get_user_credentials(username)
     return ctx and ctx['role_name'] == 'etl_service'
 
@@ -24,11 +25,13 @@ def perform_backup():
 
     print(f"[*] Starting Hot Backup of {SOURCE_DB}...")
 
+    source_conn = dest_conn = None
     try:
         # 3. Connect to Source and Destination
         # We use the SQLite Online Backup API (not just file copy) 
         # to ensure data consistency even if the DB is being written to.
-        source_conn = sqlite3.connect(SOURCE_DB)
+        # The source is opened read-only so the backup never takes a write lock.
+        source_conn = sqlite3.connect(readonly_uri(SOURCE_DB), uri=True)
         dest_conn = sqlite3.connect(backup_file)
 
         # 4. Perform Backup
@@ -48,4 +51,6 @@ if __name__ == "__main__":
 
     if not authorize_etl(username):
         print("ACCESS DENIED: Only etl_service may perform backups.")
-        exit()
\ No newline at end of file
+        exit()
+
+    perform_backup()
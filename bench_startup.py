@@ -0,0 +1,144 @@
+import re
+import os
+import sys
+import json
+import statistics
+import subprocess
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# Import time (cumulative) of every entry point, checked against the committed
+# BASELINE_FILE. Absolute milliseconds say more about the disk and CPU than about
+# the code, so every figure is a multiple of REFERENCE (`import sqlite3`, a cost
+# every entry point pays anyway), measured right before it in each of RUNS rounds.
+# The check fails if a module grows by more than MARGIN (plus SLACK reference
+# imports of noise) over its baseline, or has no baseline at all, so a heavy
+# top-level import sneaking back into the startup path is caught early.
+# Entry points import what their startup path needs at module level, so
+# `import module` is the real cost of launching it.
+RUNS = 7
+REFERENCE = 'sqlite3'
+ENTRY_POINTS = [
+    'hospital_core',
+    'hospital_middleware',
+    'hospital_service',
+    'supervisor',
+    'audit_dashboard',
+    'audit_archive',
+    'audit_verify',
+    'backup_tool',
+    'bulk_import',
+]
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(HERE, 'bench_startup_baseline.json')
+MARGIN = 0.25
+SLACK = 0.3
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def measure(module):
+    """Run `python -X importtime -c 'import module'` and return
+    (cumulative ms of the module, the five slowest imports underneath it)."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, cwd=HERE)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr}")
+
+    total = 0
+    children = []
+    for line in proc.stderr.splitlines():
+        m = IMPORTTIME_LINE.match(line)
+        if not m:
+            continue
+        cumulative_us, indent, name = int(m[2]), m[3], m[4]
+        if name == module and not indent:
+            total = cumulative_us / 1000
+        elif len(indent) == 2:
+            children.append((cumulative_us / 1000, name))
+    return total, sorted(children, reverse=True)[:5]
+
+
+def load_baseline(path=BASELINE_FILE):
+    """{module: import time as a multiple of REFERENCE}, or {} if never recorded."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('reference') != REFERENCE:
+        raise ValueError(f"{path} was recorded against '{data.get('reference')}', not '{REFERENCE}'")
+    return data['modules']
+
+
+def save_baseline(ratios, path=BASELINE_FILE):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'reference': REFERENCE,
+                   'modules': {m: round(r, 2) for m, r in ratios.items()}}, f, indent=2)
+        f.write("\n")
+
+
+def budget_for(baseline_ratio):
+    return baseline_ratio * (1 + MARGIN) + SLACK
+
+
+def run_benchmark(modules=ENTRY_POINTS, baseline=None, runs=RUNS):
+    """Measure every module; returns ({module: ratio to REFERENCE}, failures).
+    With a baseline, a module over its budget or missing from it is a failure;
+    without one (when recording), nothing is checked."""
+    # Each module is paired with a reference import taken just before it, so load
+    # on the machine hits both alike; the median pair ratio over the rounds is
+    # what gets compared, which keeps one lucky or unlucky round out of it
+    samples = {module: [] for module in modules}
+    pair_ratios = {module: [] for module in modules}
+    reference_ms = []
+    for _ in range(runs):
+        for module in modules:
+            ref_ms = measure(REFERENCE)[0]
+            sample = measure(module)
+            reference_ms.append(ref_ms)
+            samples[module].append(sample)
+            pair_ratios[module].append(sample[0] / ref_ms)
+
+    print(f"Reference: import {REFERENCE} = {statistics.median(reference_ms):.1f} ms (median)\n")
+    print(f"{'Module':<22} | {'Best ms':>8} | {'x ref':>6} | {'Base':>6} | {'Budget':>6} | Heaviest direct imports")
+    print("-" * 100)
+    ratios, failures = {}, []
+    for module in modules:
+        ms, children = min(samples[module], key=lambda s: s[0])
+        ratio = ratios[module] = statistics.median(pair_ratios[module])
+        heaviest = ", ".join(f"{name} {child_ms:.1f}" for child_ms, name in children[:3])
+        if baseline is None:
+            status = ""
+            print(f"{module:<22} | {ms:>8.1f} | {ratio:>6.2f} | {'-':>6} | {'-':>6} | {heaviest}")
+        elif module in baseline:
+            budget = budget_for(baseline[module])
+            status = "" if ratio <= budget else "  <-- OVER BUDGET"
+            print(f"{module:<22} | {ms:>8.1f} | {ratio:>6.2f} | {baseline[module]:>6.2f} | {budget:>6.2f} | "
+                  f"{heaviest}{status}")
+        else:
+            status = "  <-- NO BASELINE"
+            print(f"{module:<22} | {ms:>8.1f} | {ratio:>6.2f} | {'-':>6} | {'-':>6} | {heaviest}{status}")
+        if status:
+            failures.append(module)
+    return ratios, failures
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Import-time regression check for the entry points")
+    parser.add_argument("--record", action="store_true",
+                        help=f"save this run as the new baseline in {os.path.basename(BASELINE_FILE)}")
+    args = parser.parse_args()
+
+    baseline = None if args.record else load_baseline()
+    ratios, failures = run_benchmark(baseline=baseline)
+    if args.record:
+        save_baseline(ratios)
+        print(f"\n[+] Baseline recorded in {BASELINE_FILE}; commit it with the change that moved it.")
+        sys.exit(0)
+    if failures:
+        print(f"\n[-] Startup regression (over {MARGIN:.0%} + {SLACK} x {REFERENCE}) or no baseline for: "
+              f"{', '.join(failures)}")
+        sys.exit(1)
+    print(f"\n[+] All entry points within {MARGIN:.0%} of their baseline.")
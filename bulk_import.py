@@ -0,0 +1,247 @@
+import csv
+import json
+import os
+import sys
+import argparse
+import sqlite3
+
+from hospital_core import (
+    read_connection, write_transaction, authenticate, log_audit, audit_details, hash_password,
+    validate_patient_fields, DEFAULT_DOB
+)
+
+# CONFIGURATION
+BATCH_SIZE = 500
+PATIENT_FIELDS = ['username', 'first_name', 'last_name', 'email', 'password',
+                  'gender', 'ssn', 'phone', 'address', 'dob']
+
+
+def authorize_import(username, password):
+    """Admin context if the credentials are valid and belong to admin_db, else None."""
+    status, ctx = authenticate(username, password)
+    return ctx if status == "ok" and ctx['role_name'] == 'admin_db' else None
+
+
+# ==========================================
+# INPUT STREAMING
+# ==========================================
+
+def read_records(path):
+    """Yield (line_number, record) pairs from a CSV or NDJSON file without loading it whole."""
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.lower().endswith(('.ndjson', '.jsonl')):
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    yield line_no, {'_error': f"Malformed JSON: {e}"}
+                    continue
+                if not isinstance(record, dict):
+                    record = {'_error': "Record must be a JSON object"}
+                yield line_no, record
+        else:
+            # Header is line 1, so data rows start at line 2
+            for line_no, row in enumerate(csv.DictReader(f), start=2):
+                yield line_no, row
+
+
+def batched(records, size):
+    batch = []
+    for item in records:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def normalize(record):
+    """Strip every field and map aliases onto the canonical column names."""
+    clean = {k: str(record.get(k) or '').strip() for k in PATIENT_FIELDS}
+    if not clean['phone']:
+        clean['phone'] = str(record.get('phone_number') or '').strip()
+    clean['gender'] = clean['gender'].upper()
+    return clean
+
+
+# ==========================================
+# VALIDATION
+# ==========================================
+
+def load_existing_keys(cursor):
+    """Load every value the UNIQUE constraints care about, once, into sets.
+    Patient emails count too: the patient view links a login to a record by email."""
+    usernames = {r[0] for r in cursor.execute("SELECT username FROM Users")}
+    emails = {r[0].lower() for r in cursor.execute("SELECT email FROM Users WHERE email IS NOT NULL")}
+    emails |= {r[0].lower() for r in cursor.execute("SELECT email FROM Patients WHERE email IS NOT NULL")}
+    ssns = {r[0] for r in cursor.execute("SELECT ssn FROM Patients WHERE ssn IS NOT NULL")}
+    return usernames, emails, ssns
+
+
+def add_keys(records, usernames, emails, ssns):
+    for _, rec in records:
+        usernames.add(rec['username'])
+        emails.add(rec['email'].lower())
+        if rec['ssn']:
+            ssns.add(rec['ssn'])
+
+
+def validate_batch(batch, usernames, emails, ssns):
+    """Split a batch into accepted (line_no, record) and rejected rows. Duplicates inside
+    the batch are caught too; the caller adds the accepted keys once the batch commits."""
+    accepted, rejected = [], []
+    batch_usernames, batch_emails, batch_ssns = set(), set(), set()
+    for line_no, record in batch:
+        if '_error' in record:
+            rejected.append((line_no, record['_error'], {}))
+            continue
+
+        rec = normalize(record)
+        error = None
+        if not rec['username']:
+            error = "Username is required."
+        else:
+            error = validate_patient_fields(rec['first_name'], rec['last_name'], rec['email'],
+                                            rec['password'], rec['gender'], rec['ssn'],
+                                            rec['phone'], rec['address'], rec['dob'])
+        if not error and (rec['username'] in usernames or rec['username'] in batch_usernames):
+            error = f"Username '{rec['username']}' already exists."
+        if not error and (rec['email'].lower() in emails or rec['email'].lower() in batch_emails):
+            error = f"Email '{rec['email']}' already registered."
+        if not error and rec['ssn'] and (rec['ssn'] in ssns or rec['ssn'] in batch_ssns):
+            error = f"SSN '{rec['ssn']}' already registered."
+
+        if error:
+            rejected.append((line_no, error, rec))
+            continue
+
+        add_keys([(line_no, rec)], batch_usernames, batch_emails, batch_ssns)
+        accepted.append((line_no, rec))
+    return accepted, rejected
+
+
+# ==========================================
+# BATCH INSERT
+# ==========================================
+
+def insert_rows(cursor, records, patient_role_id):
+    # Pre-assign user ids so UserRoles can be inserted without a lookup per row
+    next_id = cursor.execute("SELECT COALESCE(MAX(user_id), 0) + 1 FROM Users").fetchone()[0]
+    user_ids = range(next_id, next_id + len(records))
+
+    cursor.executemany("""
+        INSERT INTO Patients (first_name, last_name, dob, gender, ssn, phone, email, address)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, [(r['first_name'], r['last_name'], r['dob'] or DEFAULT_DOB, r['gender'],
+           r['ssn'], r['phone'], r['email'], r['address']) for r in records])
+
+    cursor.executemany("""
+        INSERT INTO Users (user_id, username, password_hash, email, full_name, is_active)
+        VALUES (?, ?, ?, ?, ?, 1)
+    """, [(uid, r['username'], hash_password(r['password']), r['email'],
+           f"{r['first_name']} {r['last_name']}") for uid, r in zip(user_ids, records)])
+
+    cursor.executemany("INSERT INTO UserRoles (user_id, role_id) VALUES (?, ?)",
+                       [(uid, patient_role_id) for uid in user_ids])
+
+
+def insert_batch(accepted, patient_role_id):
+    """Insert one validated batch in a single writer transaction using executemany."""
+    with write_transaction() as conn:
+        insert_rows(conn.cursor(), [rec for _, rec in accepted], patient_role_id)
+
+
+def insert_each(accepted, patient_role_id):
+    """Fallback for a batch the CHECK constraints refused: insert it row by row, each
+    under its own SAVEPOINT, so only the offending rows are dropped.
+    Returns (inserted, rejected)."""
+    inserted, rejected = [], []
+    with write_transaction() as conn:
+        cursor = conn.cursor()
+        for line_no, rec in accepted:
+            cursor.execute("SAVEPOINT import_row")
+            try:
+                insert_rows(cursor, [rec], patient_role_id)
+                inserted.append((line_no, rec))
+            except sqlite3.Error as e:
+                cursor.execute("ROLLBACK TO import_row")
+                rejected.append((line_no, f"Rejected by database: {e}", rec))
+            cursor.execute("RELEASE import_row")
+    return inserted, rejected
+
+
+def write_rejects(writer, rejected):
+    for line_no, reason, rec in rejected:
+        writer.writerow([line_no, reason] + [rec.get(k, '') for k in PATIENT_FIELDS if k != 'password'])
+
+
+# ==========================================
+# PIPELINE
+# ==========================================
+
+def import_patients(path, admin_ctx, reject_path=None, batch_size=BATCH_SIZE):
+    """Stream a CSV/NDJSON file of patients into the database.
+    Returns (imported, rejected) counts."""
+    if reject_path is None:
+        reject_path = os.path.splitext(path)[0] + "_rejects.csv"
+
+    with read_connection() as conn:
+        cursor = conn.cursor()
+        role = cursor.execute("SELECT role_id FROM Roles WHERE name = 'patient'").fetchone()
+        if not role:
+            print("[!] Error: 'patient' role not found in database.")
+            return 0, 0
+        usernames, emails, ssns = load_existing_keys(cursor)
+    imported = rejected_count = 0
+
+    print(f"[*] Importing patients from {path} (batch size {batch_size})...")
+    with open(reject_path, 'w', newline='', encoding='utf-8') as rf:
+        reject_writer = csv.writer(rf)
+        reject_writer.writerow(['line', 'reason'] + [k for k in PATIENT_FIELDS if k != 'password'])
+
+        for batch in batched(read_records(path), batch_size):
+            accepted, rejected = validate_batch(batch, usernames, emails, ssns)
+            if accepted:
+                try:
+                    insert_batch(accepted, role['role_id'])
+                except sqlite3.Error:
+                    # The CHECK constraints are the final word; find the rows they disagree with
+                    try:
+                        accepted, refused = insert_each(accepted, role['role_id'])
+                    except sqlite3.Error as e:
+                        accepted, refused = [], [(line_no, f"Batch rolled back: {e}", rec)
+                                                 for line_no, rec in accepted]
+                    rejected += refused
+                add_keys(accepted, usernames, emails, ssns)
+                imported += len(accepted)
+            write_rejects(reject_writer, rejected)
+            rejected_count += len(rejected)
+            print(f"    ... {imported} imported, {rejected_count} rejected")
+
+    log_audit(admin_ctx['user_id'], admin_ctx['username'], "BULK_IMPORT", "Patients",
+              audit_details(file=os.path.basename(path), imported=imported, rejected=rejected_count))
+
+    print(f"[+] Import complete: {imported} imported, {rejected_count} rejected")
+    if rejected_count:
+        print(f"[+] Rejected rows written to {reject_path}")
+    return imported, rejected_count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk patient import (CSV or NDJSON)")
+    parser.add_argument("file", help="Input file (.csv, .ndjson or .jsonl)")
+    parser.add_argument("--rejects", help="Reject file path (default: <file>_rejects.csv)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    from getpass import getpass
+    username = input("Admin username: ")
+    admin_ctx = authorize_import(username, getpass("Password: "))
+    if not admin_ctx:
+        print("ACCESS DENIED: Only admin_db may import patients.")
+        sys.exit(1)
+
+    import_patients(args.file, admin_ctx, args.rejects, args.batch_size)
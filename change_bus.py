@@ -0,0 +1,149 @@
+import time
+import threading
+import itertools
+from collections import namedtuple
+
+from hospital_core import read_connection, write_transaction
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# SQLite triggers append one compact row to ChangeLog for every write to a
+# watched table, whichever process or tool made it (middleware, populate_db,
+# sqlite3 shell). Each process polls ChangeLog from its last seen sequence
+# number and dispatches the changes to in-process subscribers.
+POLL_INTERVAL = 0.5           # seconds between ChangeLog polls
+CHANGE_RETENTION = 86400      # seconds of history kept for catch-up
+PRUNE_EVERY = 1000            # polls between pruning runs
+
+# table -> column used as the change key. Clinical tables are keyed by
+# patient so caches can invalidate a whole patient at once.
+WATCHED_TABLES = {
+    'Users':         'user_id',
+    'UserRoles':     'user_id',
+    'Roles':         'role_id',
+    'Patients':      'patient_id',
+    'Treatments':    'patient_id',
+    'Prescriptions': 'patient_id',
+    'LabResults':    'patient_id',
+}
+
+Change = namedtuple('Change', 'seq table key op changed_at')
+
+_subscribers = {}
+_subscribers_lock = threading.Lock()
+_tokens = itertools.count(1)
+_last_seq = None
+_poll_lock = threading.Lock()
+
+
+# ==========================================
+# SCHEMA (CHANGE-LOG TABLE + TRIGGERS)
+# ==========================================
+
+def install():
+    """Create ChangeLog and its triggers if they are missing. Safe to call repeatedly."""
+    with write_transaction() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS ChangeLog (
+                seq        INTEGER PRIMARY KEY AUTOINCREMENT,   -- never reused after pruning
+                table_name TEXT NOT NULL,
+                row_key    INTEGER,
+                op         TEXT NOT NULL CHECK (op IN ('I','U','D')),
+                changed_at TEXT NOT NULL DEFAULT (datetime('now'))
+            )
+        """)
+        for table, key in WATCHED_TABLES.items():
+            for op, event, ref in (('I', 'INSERT', 'NEW'), ('U', 'UPDATE', 'NEW'), ('D', 'DELETE', 'OLD')):
+                conn.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS changelog_{table}_{op} AFTER {event} ON {table}
+                    BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('{table}', {ref}.{key}, '{op}'); END
+                """)
+            # An UPDATE that moves a row to another key changes the old key too
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS changelog_{table}_M AFTER UPDATE ON {table}
+                WHEN OLD.{key} IS NOT NEW.{key}
+                BEGIN INSERT INTO ChangeLog (table_name, row_key, op) VALUES ('{table}', OLD.{key}, 'U'); END
+            """)
+
+
+# ==========================================
+# PUBLISH / SUBSCRIBE
+# ==========================================
+
+def subscribe(table, callback, key=None):
+    """Call callback(change) for every change to `table` (optionally only for one key).
+    Returns a token for unsubscribe()."""
+    token = next(_tokens)
+    with _subscribers_lock:
+        _subscribers[token] = (table, key, callback)
+    return token
+
+
+def unsubscribe(token):
+    with _subscribers_lock:
+        _subscribers.pop(token, None)
+
+
+def publish(change):
+    """Dispatch one change to matching in-process subscribers."""
+    with _subscribers_lock:
+        targets = [cb for table, key, cb in _subscribers.values()
+                   if table == change.table and (key is None or key == change.key)]
+    for cb in targets:
+        try:
+            cb(change)
+        except Exception as e:
+            print(f"[CHANGE BUS] Subscriber failed on {change.table}:{change.key}: {e}")
+
+
+def changes_since(seq, limit=10000):
+    """Changes with a sequence number greater than `seq`, oldest first."""
+    with read_connection() as conn:
+        rows = conn.execute("""
+            SELECT seq, table_name, row_key, op, changed_at FROM ChangeLog
+            WHERE seq > ? ORDER BY seq LIMIT ?
+        """, (seq, limit)).fetchall()
+    return [Change(*r) for r in rows]
+
+
+def current_seq():
+    with read_connection() as conn:
+        return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM ChangeLog").fetchone()[0]
+
+
+def poll():
+    """Publish every change committed since the last poll. Returns how many were published."""
+    global _last_seq
+    with _poll_lock:
+        if _last_seq is None:
+            _last_seq = current_seq()
+            return 0
+        changes = changes_since(_last_seq)
+        for change in changes:
+            publish(change)
+            _last_seq = change.seq
+    return len(changes)
+
+
+def prune(retention=CHANGE_RETENTION):
+    with write_transaction() as conn:
+        conn.execute("DELETE FROM ChangeLog WHERE changed_at < datetime('now', ?)",
+                     (f"-{int(retention)} seconds",))
+
+
+def start_listener(interval=POLL_INTERVAL):
+    """Install the triggers and poll ChangeLog in a daemon thread."""
+    install()
+    poll()  # start from the current head
+
+    def loop():
+        for n in itertools.count(1):
+            time.sleep(interval)
+            try:
+                poll()
+                if n % PRUNE_EVERY == 0:
+                    prune()
+            except Exception as e:
+                print(f"[CHANGE BUS ERROR] {e}")
+    threading.Thread(target=loop, daemon=True).start()
@@ -0,0 +1,55 @@
+from hospital_core import write_transaction, log_audit, audit_details, hash_password
+
+# ==========================================
+# ADMIN USER MANAGEMENT
+# ==========================================
+
+def admin_create_user(admin_ctx):
+    if admin_ctx['role_name'] != 'admin_db':
+        return "ACCESS DENIED"
+
+    print("\n--- CREATE NEW USER ---")
+    username = input("New username: ").strip()
+    password = input("Password: ").strip()
+    email    = input("Email: ").strip()
+    full     = input("Full name: ").strip()
+    role     = input("Role (doctor/nurse/pharmacist/lab_tech/auditor/admin_db/patient): ").strip()
+
+    with write_transaction() as conn:
+        cur = conn.cursor()
+
+        cur.execute("SELECT 1 FROM Users WHERE username=?", (username,))
+        if cur.fetchone():
+            return "Username already exists."
+
+        cur.execute("SELECT role_id FROM Roles WHERE name=?", (role,))
+        role_id = cur.fetchone()
+        if not role_id:
+            return "Invalid role."
+
+        pw_hash = hash_password(password)
+        cur.execute("INSERT INTO Users (username,password_hash,email,full_name,is_active) VALUES (?,?,?,?,1)",
+                    (username,pw_hash,email,full))
+
+        user_id = cur.lastrowid
+        cur.execute("INSERT INTO UserRoles (user_id,role_id) VALUES (?,?)", (user_id, role_id['role_id']))
+
+    log_audit(admin_ctx['user_id'], admin_ctx['username'], "ADMIN_CREATE", "Users", audit_details(username=username))
+    return f"User {username} created successfully."
+
+
+def admin_delete_user(admin_ctx):
+    if admin_ctx['role_name'] != 'admin_db':
+        return "ACCESS DENIED"
+
+    username = input("Username to DELETE: ").strip()
+
+    with write_transaction() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT user_id FROM Users WHERE username=?", (username,))
+        if not cur.fetchone():
+            return "User not found."
+        cur.execute("DELETE FROM Users WHERE username=?", (username,))
+
+    log_audit(admin_ctx['user_id'], admin_ctx['username'], "ADMIN_DELETE", "Users", audit_details(username=username))
+    return f"User {username} deleted."
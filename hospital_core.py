@@ -0,0 +1,481 @@
+import sqlite3
+import os
+import sys
+import hashlib
+import re
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import metrics
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# Shared database, authentication and audit code. Every entry point (middleware,
+# dashboard, backup, import, archive tools) imports this module only, so it
+# must stay cheap to import: no Minecraft, HTTP or admin code here.
+DB_PATH = 'hospital_mc.db'
+
+# DEFAULT DATA
+DEFAULT_DOB = "2004-05-01"
+
+# FIELD FORMATS (mirror the CHECK constraints on the Patients table)
+SSN_PATTERN   = re.compile(r"[0-9]{3}-[0-9]{2}-[0-9]{4}")
+PHONE_PATTERN = re.compile(r"[0-9]{3} [0-9]{3} [0-9]{3}")
+EMAIL_PATTERN = re.compile(r"@.*\.", re.DOTALL)   # email LIKE '%@%.%'
+DOB_PATTERN   = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2}")   # date(dob) needs the zero padding
+VALID_GENDERS = ('M', 'F', 'O')
+
+# ==========================================
+# DATABASE CONNECTION LAYER
+# ==========================================
+# Reads go to a small pool of read-only (mode=ro) connections; every write goes
+# through one serialized writer connection. With WAL enabled, readers never
+# wait behind the writer, and writer lock waits are recorded in metrics.
+READ_POOL_SIZE = 4
+READ_POOL_TIMEOUT = 10        # seconds to wait for a free reader before failing
+BUSY_TIMEOUT_MS = 5000
+
+# Several processes (one per wing) can share the database, so the writer lock
+# may be held by another process. The writer waits briefly inside SQLite, then
+# retries BEGIN IMMEDIATE with jittered exponential backoff so waiting
+# processes do not all wake and collide at the same moment.
+WRITER_BUSY_TIMEOUT_MS = 200
+WRITE_RETRIES = 8
+WRITE_BACKOFF_BASE = 0.02     # seconds, doubled per attempt
+WRITE_BACKOFF_MAX = 1.0
+
+_reader_pool = []            # idle readers, most recently returned last
+_reader_count = 0
+_pool_cond = threading.Condition()
+
+_writer_conn = None
+_write_lock = threading.Lock()
+_writer_state = threading.local()
+
+_wal_ready = False
+_wal_lock = threading.Lock()
+
+
+def _ensure_wal():
+    """Switch the database to WAL once per process. Uses its own lock, so a
+    reader growing the pool never waits behind (or deadlocks inside) a write."""
+    global _wal_ready
+    if _wal_ready:
+        return
+    with _wal_lock:
+        if not _wal_ready:
+            conn = sqlite3.connect(DB_PATH)
+            try:
+                conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+                conn.execute("PRAGMA journal_mode = WAL")
+            finally:
+                conn.close()
+            _wal_ready = True
+
+
+class PooledReadConnection(sqlite3.Connection):
+    """Read-only connection that returns itself to the pool on close()."""
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+        with _pool_cond:
+            _reader_pool.append(self)
+            _pool_cond.notify()
+
+
+def _get_writer():
+    global _writer_conn
+    if _writer_conn is None:
+        _ensure_wal()
+        conn = sqlite3.connect(DB_PATH, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute(f"PRAGMA busy_timeout = {WRITER_BUSY_TIMEOUT_MS}")
+        _writer_conn = conn
+    return _writer_conn
+
+
+def readonly_uri(path):
+    """file: URI opening `path` read-only (what pathlib's as_uri() gives, without importing it)."""
+    path = os.path.abspath(path).replace(os.sep, '/')
+    if not path.startswith('/'):
+        path = '/' + path   # C:/... on Windows
+    for ch, escaped in (('%', '%25'), (' ', '%20'), ('?', '%3F'), ('#', '%23')):
+        path = path.replace(ch, escaped)
+    return f"file:{path}?mode=ro"
+
+
+@metrics.timed("get_read_db")
+def get_read_db():
+    """Borrow a read-only connection from the pool. close() hands it back, so
+    callers must close it in a finally block (or use read_connection()).
+    Raises sqlite3.Error if the connection fails, or sqlite3.OperationalError
+    if no reader frees up within READ_POOL_TIMEOUT."""
+    global _reader_count
+    with _pool_cond:
+        # An idle reader, or room to open one (a failed open frees its slot again)
+        if not _pool_cond.wait_for(lambda: _reader_pool or _reader_count < READ_POOL_SIZE,
+                                   timeout=READ_POOL_TIMEOUT):
+            raise sqlite3.OperationalError(f"No read connection free after {READ_POOL_TIMEOUT}s")
+        if _reader_pool:
+            return _reader_pool.pop()
+        _reader_count += 1
+
+    try:
+        _ensure_wal()
+        conn = sqlite3.connect(readonly_uri(DB_PATH), uri=True, check_same_thread=False,
+                               factory=PooledReadConnection)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        return conn
+    except sqlite3.Error as e:
+        with _pool_cond:
+            _reader_count -= 1
+            _pool_cond.notify()
+        print(f"[DB ERROR] Read connection failed: {e}")
+        raise
+
+
+@contextmanager
+def read_connection():
+    """`with read_connection() as conn:` borrows a pooled reader and always returns it."""
+    conn = get_read_db()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def _begin_immediate(conn):
+    """BEGIN IMMEDIATE, retrying with backoff while another process holds the write lock."""
+    for attempt in range(WRITE_RETRIES + 1):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            return
+        except sqlite3.OperationalError as e:
+            if attempt == WRITE_RETRIES or ('locked' not in str(e) and 'busy' not in str(e)):
+                raise
+            metrics.inc("write_busy_retries")
+            import random   # only reached under contention
+            time.sleep(random.uniform(0, min(WRITE_BACKOFF_MAX, WRITE_BACKOFF_BASE * 2 ** attempt)))
+
+
+@contextmanager
+def write_transaction():
+    """Run a block inside one IMMEDIATE transaction on the shared writer.
+    Nested calls on the same thread join the outer transaction."""
+    if getattr(_writer_state, 'depth', 0):
+        _writer_state.depth += 1
+        try:
+            yield _writer_conn
+        finally:
+            _writer_state.depth -= 1
+        return
+
+    with metrics.timer("writer_lock_wait"):
+        _write_lock.acquire()
+    try:
+        conn = _get_writer()
+        _writer_state.depth = 1
+        with metrics.timer("write_transaction"):
+            _begin_immediate(conn)
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+    finally:
+        _writer_state.depth = 0
+        _write_lock.release()
+
+def get_table_columns(table_name):
+    """Get actual column names from a table"""
+    try:
+        with read_connection() as conn:
+            return [row[1] for row in conn.execute(f"PRAGMA table_info({table_name})")]
+    except Exception as e:
+        print(f"[DB ERROR] Could not get columns for {table_name}: {e}")
+        return []
+
+# ==========================================
+# SECURITY LAYER
+# ==========================================
+
+def hash_password(plain_password):
+    return hashlib.sha256(plain_password.encode()).hexdigest()
+
+# ==========================================
+# AUDIT CHAIN (APPEND-ONLY, HASH-CHAINED)
+# ==========================================
+# Every AuditLogs row stores the hash of the previous row, so any UPDATE,
+# DELETE or insertion in the middle breaks the chain. Every
+# AUDIT_CHECKPOINT_EVERY rows the chain head is signed (HMAC-SHA256) into
+# AuditCheckpoints, which lets audit_verify.py check segments in parallel.
+AUDIT_GENESIS_HASH = "0" * 64
+AUDIT_CHECKPOINT_EVERY = 1000
+AUDIT_KEY_FILE = 'audit_checkpoint.key'
+
+_audit_chain_ready = False
+_audit_key = None
+
+
+class AuditEvent:
+    """One audit record on its way to AuditLogs. Action and table names are
+    interned, so every queued event shares one string per distinct code, and the
+    patient a record concerns is a column rather than text inside `details`."""
+    __slots__ = ('user_id', 'action', 'table_name', 'details', 'patient_id')
+
+    def __init__(self, user_id, action, table_name, details=None, patient_id=None):
+        self.user_id = user_id
+        self.action = sys.intern(action)
+        self.table_name = sys.intern(table_name) if table_name else None
+        self.details = details
+        self.patient_id = patient_id
+
+
+def audit_details(**fields):
+    """`details` for values that have no column of their own: compact JSON with
+    sorted keys, so the text is stable for the row hash and queryable with
+    json_extract (guard with json_valid: older rows hold free text)."""
+    import json
+    return json.dumps(fields, separators=(',', ':'), sort_keys=True)
+
+
+def audit_row_hash(prev_hash, log_id, user_id, action, table_name, timestamp, details, patient_id=None):
+    fields = (prev_hash, log_id, user_id, action, table_name, timestamp, details)
+    if patient_id is not None:
+        fields += (patient_id,)   # rows without a patient keep their pre-column hash
+    payload = "\x1f".join("" if v is None else str(v) for v in fields)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _read_or_create_key_file(path):
+    """Create the key file owner-only and exclusively, so two processes starting
+    together cannot each write (and cache) a different key; the loser reads the winner's."""
+    import secrets
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+    except FileExistsError:
+        pass
+    else:
+        with os.fdopen(fd, 'w') as f:
+            f.write(secrets.token_hex(32))
+
+    if os.stat(path).st_mode & 0o077:
+        try:
+            os.chmod(path, 0o600)   # key file from before it was created owner-only
+        except OSError:
+            print(f"[AUDIT] Warning: {path} is readable by other users")
+    for _ in range(50):
+        with open(path) as f:
+            key = f.read().strip()
+        if key:
+            return key
+        time.sleep(0.02)   # created by another process that has not written it yet
+    raise RuntimeError(f"Audit key file {path} is empty")
+
+
+def load_audit_key():
+    """Checkpoint signing key: HOSPITAL_AUDIT_KEY, else a local key file created on first use."""
+    global _audit_key
+    if _audit_key is None:
+        key = os.environ.get("HOSPITAL_AUDIT_KEY") or _read_or_create_key_file(AUDIT_KEY_FILE)
+        _audit_key = key.encode()
+    return _audit_key
+
+
+def sign_checkpoint(last_log_id, row_hash):
+    import hmac
+    message = f"{last_log_id}:{row_hash}".encode()
+    return hmac.new(load_audit_key(), message, hashlib.sha256).hexdigest()
+
+
+def _write_checkpoint(conn, last_log_id, row_hash):
+    conn.execute("""
+        INSERT INTO AuditCheckpoints (last_log_id, row_hash, signature, created_at)
+        VALUES (?, ?, ?, datetime('now'))
+    """, (last_log_id, row_hash, sign_checkpoint(last_log_id, row_hash)))
+
+
+def _ensure_audit_chain(conn):
+    """Add the chain columns, checkpoint table and append-only triggers on first use,
+    and hash any legacy rows written before the chain existed."""
+    global _audit_chain_ready
+    if _audit_chain_ready:
+        return
+
+    cols = [r[1] for r in conn.execute("PRAGMA table_info(AuditLogs)")]
+    if 'row_hash' not in cols:
+        conn.execute("ALTER TABLE AuditLogs ADD COLUMN prev_hash TEXT")
+        conn.execute("ALTER TABLE AuditLogs ADD COLUMN row_hash TEXT")
+    if 'patient_id' not in cols:
+        conn.execute("ALTER TABLE AuditLogs ADD COLUMN patient_id INTEGER")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_patient ON AuditLogs(patient_id, action)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS AuditCheckpoints (
+            checkpoint_id INTEGER PRIMARY KEY,
+            last_log_id   INTEGER NOT NULL UNIQUE,
+            row_hash      TEXT NOT NULL,
+            signature     TEXT NOT NULL,
+            created_at    TEXT NOT NULL DEFAULT (datetime('now'))
+        )
+    """)
+
+    if conn.execute("SELECT 1 FROM AuditLogs WHERE row_hash IS NULL LIMIT 1").fetchone():
+        print("[AUDIT] Hashing legacy audit rows into the chain...", file=sys.stderr)
+        conn.execute("DROP TRIGGER IF EXISTS audit_no_update")
+        prev = AUDIT_GENESIS_HASH
+        rows = conn.execute("""
+            SELECT log_id, user_id, action, table_name, timestamp, details, row_hash
+            FROM AuditLogs ORDER BY log_id
+        """).fetchall()
+        for r in rows:
+            if r['row_hash'] is None:
+                row_hash = audit_row_hash(prev, r['log_id'], r['user_id'], r['action'],
+                                          r['table_name'], r['timestamp'], r['details'])
+                conn.execute("UPDATE AuditLogs SET prev_hash = ?, row_hash = ? WHERE log_id = ?",
+                             (prev, row_hash, r['log_id']))
+                prev = row_hash
+            else:
+                prev = r['row_hash']
+        _write_checkpoint(conn, rows[-1]['log_id'], prev)
+
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS audit_no_update BEFORE UPDATE ON AuditLogs
+        BEGIN SELECT RAISE(ABORT, 'AuditLogs is append-only'); END
+    """)
+    # Rows may only leave the hot table once audit_archive.py has copied them
+    # into a monthly archive file and recorded them in AuditArchives.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS AuditArchives (
+            month         TEXT PRIMARY KEY,   -- YYYY-MM
+            file_path     TEXT NOT NULL,
+            first_log_id  INTEGER NOT NULL,
+            last_log_id   INTEGER NOT NULL,
+            last_row_hash TEXT NOT NULL,
+            row_count     INTEGER NOT NULL
+        )
+    """)
+    conn.execute("DROP TRIGGER IF EXISTS audit_no_delete")
+    conn.execute("""
+        CREATE TRIGGER audit_no_delete BEFORE DELETE ON AuditLogs
+        WHEN OLD.log_id > (SELECT COALESCE(MAX(last_log_id), 0) FROM AuditArchives)
+        BEGIN SELECT RAISE(ABORT, 'AuditLogs is append-only'); END
+    """)
+    _audit_chain_ready = True
+
+
+def ensure_audit_schema():
+    """Run the audit chain migration now instead of waiting for the first audit write."""
+    with write_transaction() as conn:
+        _ensure_audit_chain(conn)
+
+
+@metrics.timed("log_audit_batch")
+def log_audit_batch(events):
+    """Append AuditEvents in one transaction, chaining each row's hash to the previous one."""
+    events = list(events)
+    if not events:
+        return
+    try:
+        with write_transaction() as conn:
+            _ensure_audit_chain(conn)
+            last = conn.execute("SELECT log_id, row_hash FROM AuditLogs ORDER BY log_id DESC LIMIT 1").fetchone()
+            if not last:
+                # Hot table fully archived: continue the chain from the newest archive
+                last = conn.execute("""
+                    SELECT last_log_id AS log_id, last_row_hash AS row_hash
+                    FROM AuditArchives ORDER BY last_log_id DESC LIMIT 1
+                """).fetchone()
+            last_id, prev = (last['log_id'], last['row_hash']) if last else (0, AUDIT_GENESIS_HASH)
+            timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+            rows = []
+            for e in events:
+                last_id += 1
+                row_hash = audit_row_hash(prev, last_id, e.user_id, e.action, e.table_name,
+                                          timestamp, e.details, e.patient_id)
+                rows.append((last_id, e.user_id, e.action, e.table_name, timestamp, e.details,
+                             prev, row_hash, e.patient_id))
+                prev = row_hash
+
+            conn.executemany("""
+                INSERT INTO AuditLogs (log_id, user_id, action, table_name, timestamp, details, prev_hash, row_hash, patient_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+
+            last_cp = conn.execute("SELECT COALESCE(MAX(last_log_id), 0) FROM AuditCheckpoints").fetchone()[0]
+            if last_id - last_cp >= AUDIT_CHECKPOINT_EVERY:
+                _write_checkpoint(conn, last_id, prev)
+    except Exception as e:
+        print(f"[AUDIT ERROR] Failed to log: {e}")
+
+
+@metrics.timed("log_audit")
+def log_audit(user_id, username, action, table_name, details=None, patient_id=None):
+    log_audit_batch([AuditEvent(user_id, action, table_name, details, patient_id)])
+
+@metrics.timed("get_user_credentials")
+def get_user_credentials(username_input):
+    query = """
+    SELECT u.user_id, u.username, u.password_hash, u.email, u.full_name, r.name as role_name
+    FROM Users u
+    JOIN UserRoles ur ON u.user_id = ur.user_id
+    JOIN Roles r ON ur.role_id = r.role_id
+    WHERE u.username = ? AND u.is_active = 1
+    """
+    with read_connection() as conn:
+        return conn.execute(query, (username_input,)).fetchone()
+
+
+def authenticate(username, password):
+    """Check a username/password pair. Returns (status, user_context) where status
+    is 'ok', 'unknown_user' or 'auth_failed'. Failed passwords are audited."""
+    from hmac import compare_digest
+    user_context = get_user_credentials(username)
+    if not user_context:
+        return "unknown_user", None
+    if not compare_digest(hash_password(password), user_context['password_hash']):
+        log_audit(user_context['user_id'], username, "LOGIN_FAIL", "Users", "Invalid password")
+        return "auth_failed", None
+    return "ok", user_context
+
+
+# ==========================================
+# VALIDATION
+# ==========================================
+
+def validate_patient_fields(first_name, last_name, email, password,
+                            gender, ssn, phone_number, address, dob=None):
+    """Check a registration against the form rules and the Patients CHECK constraints.
+    Returns an error message, or None if the record is valid."""
+    if not first_name:
+        return "First name is required."
+    if not last_name:
+        return "Last name is required."
+    if not email or not EMAIL_PATTERN.search(email):
+        return "Valid email is required."
+    if not password or len(password) < 4:
+        return "Password must be at least 4 characters."
+    if gender not in VALID_GENDERS:
+        return "Invalid gender."
+    if not ssn or not SSN_PATTERN.fullmatch(ssn):
+        return "Invalid SSN format."
+    if not phone_number or not PHONE_PATTERN.fullmatch(phone_number):
+        return "Invalid phone format."
+    if not address:
+        return "Address is required."
+    if dob:
+        try:
+            if not DOB_PATTERN.fullmatch(dob):
+                raise ValueError(dob)
+            datetime.strptime(dob, "%Y-%m-%d")
+        except ValueError:
+            return "Invalid date of birth (YYYY-MM-DD)."
+    return None
@@ -1,22 +1,27 @@
 import sqlite3
 import time
 import sys
-import hashlib
-from datetime import datetime
+import os
+import csv
+import json
+import threading
+from collections import OrderedDict
+
+import metrics
+import rate_limit
+from hospital_core import (
+    DB_PATH, DEFAULT_DOB, read_connection, write_transaction, get_table_columns,
+    hash_password, log_audit, audit_details, get_user_credentials, authenticate, validate_patient_fields
+)
 
 # ==========================================
 # CONFIGURATION
 # ==========================================
-DB_PATH = 'hospital_mc.db'
-
 # UPDATED: Coordinates from your debug log to ensure it detects the hit
 TERMINAL_X = 76
 TERMINAL_Y = 11
 TERMINAL_Z = 48
 
-# DEFAULT DATA
-DEFAULT_DOB = "2004-05-01"
-
 # DOOR COORDS
 DOOR_X = 106
 DOOR_Y = 11
@@ -26,148 +31,17 @@ DOOR2_X = 106
 DOOR2_Y = 11
 DOOR2_Z = 37
 
+DOOR_POSITIONS = {(DOOR_X, DOOR_Y, DOOR_Z), (DOOR2_X, DOOR2_Y, DOOR2_Z)}
 
-
-
-# Attempt to load Minecraft library
-try:
-    from mcpi.minecraft import Minecraft
-    MC_AVAILABLE = True
-except ImportError:
-    MC_AVAILABLE = False
+# Minecraft server (mcpi defaults); supervisor workers override these per wing
+MC_HOST = "localhost"
+MC_PORT = 4711
 
 # Global dictionary to track registration state for Minecraft players
 mc_registration_state = {}
 
-# ==========================================
-# DATABASE CONNECTION LAYER
-# ==========================================
-def get_db():
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        conn.execute("PRAGMA foreign_keys = ON")
-        return conn
-    except sqlite3.Error as e:
-        print(f"[DB ERROR] Connection failed: {e}")
-        return None
-
-def get_table_columns(table_name):
-    """Get actual column names from a table"""
-    conn = get_db()
-    if not conn: return []
-    cursor = conn.cursor()
-    try:
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        columns = [row[1] for row in cursor.fetchall()]
-        conn.close()
-        return columns
-    except Exception as e:
-        print(f"[DB ERROR] Could not get columns for {table_name}: {e}")
-        conn.close()
-        return []
-
-# ==========================================
-# SECURITY LAYER
-# ==========================================
-
-def hash_password(plain_password):
-    return hashlib.sha256(plain_password.encode()).hexdigest()
-
-def log_audit(user_id, username, action, table_name, details):
-    conn = get_db()
-    if not conn: return
-    cursor = conn.cursor()
-    try:
-        cursor.execute("""
-            INSERT INTO AuditLogs (user_id, action, table_name, details, timestamp) 
-            VALUES (?, ?, ?, ?, datetime('now'))
-        """, (user_id, action, table_name, details))
-        conn.commit()
-    except Exception as e:
-        print(f"[AUDIT ERROR] Failed to log: {e}")
-    finally:
-        conn.close()
-
-def get_user_credentials(username_input):
-    conn = get_db()
-    if not conn: return None
-    cursor = conn.cursor()
-    query = """
-    SELECT u.user_id, u.username, u.password_hash, u.email, u.full_name, r.name as role_name
-    FROM Users u
-    JOIN UserRoles ur ON u.user_id = ur.user_id
-    JOIN Roles r ON ur.role_id = r.role_id
-    WHERE u.username = ? AND u.is_active = 1
-    """
-    cursor.execute(query, (username_input,))
-    result = cursor.fetchone()
-    conn.close()
-    return result
-
-# ==========================================
-# ADMIN USER MANAGEMENT
-# ==========================================
-
-def admin_create_user(admin_ctx):
-    if admin_ctx['role_name'] != 'admin_db':
-        return "ACCESS DENIED"
-
-    print("\n--- CREATE NEW USER ---")
-    username = input("New username: ").strip()
-    password = input("Password: ").strip()
-    email    = input("Email: ").strip()
-    full     = input("Full name: ").strip()
-    role     = input("Role (doctor/nurse/pharmacist/lab_tech/auditor/admin_db/patient): ").strip()
-
-    conn = get_db()
-    cur = conn.cursor()
-
-    cur.execute("SELECT 1 FROM Users WHERE username=?", (username,))
-    if cur.fetchone():
-        conn.close()
-        return "Username already exists."
-
-    pw_hash = hash_password(password)
-    cur.execute("INSERT INTO Users (username,password_hash,email,full_name,is_active) VALUES (?,?,?,?,1)",
-                (username,pw_hash,email,full))
-
-    user_id = cur.lastrowid
-    cur.execute("SELECT role_id FROM Roles WHERE name=?", (role,))
-    role_id = cur.fetchone()
-
-    if not role_id:
-        conn.rollback()
-        conn.close()
-        return "Invalid role."
-
-    cur.execute("INSERT INTO UserRoles (user_id,role_id) VALUES (?,?)", (user_id, role_id['role_id']))
-    conn.commit()
-    log_audit(admin_ctx['user_id'], admin_ctx['username'], "ADMIN_CREATE", "Users", f"Created {username}")
-    conn.close()
-    return f"User {username} created successfully."
-
-
-def admin_delete_user(admin_ctx):
-    if admin_ctx['role_name'] != 'admin_db':
-        return "ACCESS DENIED"
-
-    username = input("Username to DELETE: ").strip()
-    conn = get_db()
-    cur = conn.cursor()
-
-    cur.execute("SELECT user_id FROM Users WHERE username=?", (username,))
-    r = cur.fetchone()
-    if not r:
-        conn.close()
-        return "User not found."
-
-    cur.execute("DELETE FROM Users WHERE username=?", (username,))
-    conn.commit()
-    log_audit(admin_ctx['user_id'], admin_ctx['username'], "ADMIN_DELETE", "Users", f"Deleted {username}")
-    conn.close()
-    return f"User {username} deleted."
-
+# Completed Minecraft loop iterations; the supervisor uses it as a liveness signal
+loop_iterations = 0
 
 # ==========================================
 # REGISTRATION FUNCTIONS
@@ -201,136 +75,109 @@ def register_new_patient_console(username):
     
     # Optional fields with defaults
     gender = input("Enter Gender (M/F/O): ").strip().upper()
-    if gender not in ['M','F','O']:
-        print("[!] Invalid gender.")
-        return False
-
     ssn = input("Enter SSN (XXX-XX-XXXX): ").strip()
-    if len(ssn) != 11 or ssn[3] != '-' or ssn[6] != '-':
-        print("[!] Invalid SSN format.")
-        return False
-
     phone_number = input("Enter Phone (XXX XXX XXX): ").strip()
-    if len(phone_number) != 11:
-        print("[!] Invalid phone format.")
-        return False
-
     address = input("Enter Address: ").strip()
-    if not address:
-        print("[!] Address is required.")
+
+    error = validate_patient_fields(first_name, last_name, email, password,
+                                    gender, ssn, phone_number, address)
+    if error:
+        print(f"[!] {error}")
         return False
 
-    
     return register_patient_to_db(username, first_name, last_name, email, password,
                                 ssn, phone_number, address, gender)
 
 
-def register_patient_to_db(username, first_name, last_name, email, password, 
-                           ssn=None, phone_number=None, address=None):
+def register_patient_to_db(username, first_name, last_name, email, password,
+                           ssn=None, phone_number=None, address=None, gender=None):
     """Insert new patient and user into database"""
-    conn = get_db()
-    if not conn:
-        print("[!] Database connection failed.")
-        return False
-    
-    cursor = conn.cursor()
-    
-    try:
-        # Check if username already exists
-        cursor.execute("SELECT username FROM Users WHERE username = ?", (username,))
-        if cursor.fetchone():
-            print(f"[!] Username '{username}' already exists.")
-            conn.close()
-            return False
-        
-        # Check if email already exists
-        cursor.execute("SELECT email FROM Users WHERE email = ?", (email,))
-        if cursor.fetchone():
-            print(f"[!] Email '{email}' already registered.")
-            conn.close()
-            return False
-        
-        # Get actual Patients table columns
-        patient_cols = get_table_columns("Patients")
-        
-        # Build dynamic INSERT based on available columns
-        available_data = {
-            'first_name': first_name,
-            'last_name': last_name,
-            'email': email
-        }
+    # Get actual Patients table columns
+    patient_cols = get_table_columns("Patients")
+    full_name = f"{first_name} {last_name}"
 
-        # FIX: dob is NOT NULL in DB, so provide default if column exists
-        if 'dob' in patient_cols:
-            available_data['dob'] = DEFAULT_DOB
+    try:
+        with write_transaction() as conn:
+            cursor = conn.cursor()
+
+            # Check if username already exists
+            cursor.execute("SELECT username FROM Users WHERE username = ?", (username,))
+            if cursor.fetchone():
+                print(f"[!] Username '{username}' already exists.")
+                return False
+
+            # Check if email already exists
+            cursor.execute("SELECT email FROM Users WHERE email = ?", (email,))
+            if cursor.fetchone():
+                print(f"[!] Email '{email}' already registered.")
+                return False
+
+            # Get patient role_id
+            cursor.execute("SELECT role_id FROM Roles WHERE name = 'patient'")
+            role_result = cursor.fetchone()
+            if not role_result:
+                print("[!] Error: 'patient' role not found in database.")
+                return False
+
+            # Build dynamic INSERT based on available columns
+            available_data = {
+                'first_name': first_name,
+                'last_name': last_name,
+                'email': email
+            }
+
+            # FIX: dob is NOT NULL in DB, so provide default if column exists
+            if 'dob' in patient_cols:
+                available_data['dob'] = DEFAULT_DOB
+
+            # Add optional fields only if columns exist
+            if 'ssn' in patient_cols and ssn:
+                available_data['ssn'] = ssn
+            if 'phone' in patient_cols and phone_number:
+                available_data['phone'] = phone_number
+            if 'phone_number' in patient_cols and phone_number:
+                available_data['phone_number'] = phone_number
+            if 'address' in patient_cols and address:
+                available_data['address'] = address
+            if 'gender' in patient_cols and gender:
+                available_data['gender'] = gender
+
+            # Create INSERT statement dynamically
+            cols = ', '.join(available_data.keys())
+            placeholders = ', '.join(['?' for _ in available_data])
+            values = tuple(available_data.values())
+
+            insert_query = f"INSERT INTO Patients ({cols}) VALUES ({placeholders})"
+            cursor.execute(insert_query, values)
+
+            patient_id = cursor.lastrowid
+
+            # Insert into Users table
+            password_hash = hash_password(password)
+            cursor.execute("""
+                INSERT INTO Users (username, password_hash, email, full_name, is_active)
+                VALUES (?, ?, ?, ?, 1)
+            """, (username, password_hash, email, full_name))
+
+            user_id = cursor.lastrowid
+
+            # Assign patient role
+            cursor.execute("""
+                INSERT INTO UserRoles (user_id, role_id)
+                VALUES (?, ?)
+            """, (user_id, role_result['role_id']))
 
-        
-        # Add optional fields only if columns exist
-        if 'ssn' in patient_cols and ssn:
-            available_data['ssn'] = ssn
-        if 'phone' in patient_cols and phone_number:
-            available_data['phone'] = phone_number
-        if 'phone_number' in patient_cols and phone_number:
-            available_data['phone_number'] = phone_number
-        if 'address' in patient_cols and address:
-            available_data['address'] = address
-        
-        # Create INSERT statement dynamically
-        cols = ', '.join(available_data.keys())
-        placeholders = ', '.join(['?' for _ in available_data])
-        values = tuple(available_data.values())
-        
-        insert_query = f"INSERT INTO Patients ({cols}) VALUES ({placeholders})"
-        cursor.execute(insert_query, values)
-        
-        patient_id = cursor.lastrowid
-        
-        # Insert into Users table
-        password_hash = hash_password(password)
-        full_name = f"{first_name} {last_name}"
-        
-        cursor.execute("""
-            INSERT INTO Users (username, password_hash, email, full_name, is_active)
-            VALUES (?, ?, ?, ?, 1)
-        """, (username, password_hash, email, full_name))
-        
-        user_id = cursor.lastrowid
-        
-        # Get patient role_id
-        cursor.execute("SELECT role_id FROM Roles WHERE name = 'patient'")
-        role_result = cursor.fetchone()
-        
-        if not role_result:
-            print("[!] Error: 'patient' role not found in database.")
-            conn.rollback()
-            conn.close()
-            return False
-        
-        role_id = role_result['role_id']
-        
-        # Assign patient role
-        cursor.execute("""
-            INSERT INTO UserRoles (user_id, role_id)
-            VALUES (?, ?)
-        """, (user_id, role_id))
-        
-        conn.commit()
-        
-        # Log the registration
-        log_audit(user_id, username, "REGISTER", "Users", f"New patient registered: {full_name}")
-        
-        print(f"\n[+] SUCCESS! Patient '{full_name}' registered with username '{username}'")
-        print(f"[+] Patient ID: {patient_id} | User ID: {user_id}")
-        
-        conn.close()
-        return True
-        
     except sqlite3.Error as e:
         print(f"[!] Database error during registration: {e}")
-        conn.rollback()
-        conn.close()
         return False
 
+    # Log the registration
+    log_audit(user_id, username, "REGISTER", "Users", "New patient registered", patient_id)
+
+    print(f"\n[+] SUCCESS! Patient '{full_name}' registered with username '{username}'")
+    print(f"[+] Patient ID: {patient_id} | User ID: {user_id}")
+    return True
+
 def process_minecraft_registration(mc, player_name, chat_message):
     """Handle step-by-step registration via Minecraft chat"""
     
@@ -422,24 +269,138 @@ def process_minecraft_registration(mc, player_name, chat_message):
     
     return True
 
+# ==========================================
+# CLINICAL SUMMARY ENGINE
+# ==========================================
+# A patient's treatments, prescriptions and lab results are loaded with one
+# UNION ALL query and cached unmasked per patient. Masking is applied per
+# role and per section when the summary is rendered, so one cache entry
+# serves every role. Entries are invalidated through change_bus whenever any
+# process writes one of these tables; the TTL is a safety net for when no
+# change listener is running.
+CLINICAL_CACHE_SIZE = 1024
+CLINICAL_CACHE_TTL = 60  # seconds
+
+# Section visibility per role: full, masked (names only) or restricted
+CLINICAL_SECTION_POLICY = {
+    'doctor':     {'Tx': 'full',       'Rx': 'full',       'Labs': 'full'},
+    'nurse':      {'Tx': 'restricted', 'Rx': 'full',       'Labs': 'masked'},
+    'pharmacist': {'Tx': 'restricted', 'Rx': 'full',       'Labs': 'restricted'},
+    'lab_tech':   {'Tx': 'restricted', 'Rx': 'restricted', 'Labs': 'full'},
+    'patient':    {'Tx': 'full',       'Rx': 'full',       'Labs': 'full'},
+}
+
+CLINICAL_SUMMARY_QUERY = """
+    SELECT 'Tx' AS section, description AS name, status AS value, NULL AS unit, start_date AS date
+    FROM Treatments WHERE patient_id = :pid
+    UNION ALL
+    SELECT 'Rx', medication, dosage, NULL, start_date
+    FROM Prescriptions WHERE patient_id = :pid
+    UNION ALL
+    SELECT 'Labs', test_name, result_value, unit, test_date
+    FROM LabResults WHERE patient_id = :pid
+    ORDER BY 1, 5
+"""
+
+_clinical_cache = OrderedDict()
+_clinical_cache_lock = threading.Lock()
+# Bumped on every invalidation, so a summary read while one arrives is not cached
+_clinical_generation = {}   # patient_id -> invalidations so far
+_clinical_epoch = 0         # invalidations of every patient
+
+
+def invalidate_clinical_summary(patient_id=None):
+    """Drop one patient's cached summary, or every summary if patient_id is None."""
+    global _clinical_epoch
+    with _clinical_cache_lock:
+        if patient_id is None:
+            _clinical_cache.clear()
+            _clinical_epoch += 1
+        else:
+            _clinical_cache.pop(patient_id, None)
+            _clinical_generation[patient_id] = _clinical_generation.get(patient_id, 0) + 1
+
+
+def start_cache_invalidation():
+    """Subscribe the summary cache to clinical table changes from any process."""
+    import change_bus
+    for table in ('Patients', 'Treatments', 'Prescriptions', 'LabResults'):
+        change_bus.subscribe(table, lambda change: invalidate_clinical_summary(change.key))
+    change_bus.start_listener()
+
+
+@metrics.timed("get_clinical_summary")
+def get_clinical_summary(conn, patient_id):
+    """Return {'Tx': [...], 'Rx': [...], 'Labs': [...]} of (name, value, unit) tuples."""
+    now = time.monotonic()
+    with _clinical_cache_lock:
+        entry = _clinical_cache.get(patient_id)
+        if entry and now - entry[0] < CLINICAL_CACHE_TTL:
+            _clinical_cache.move_to_end(patient_id)
+            metrics.inc("clinical_cache_hits")
+            return entry[1]
+        generation = (_clinical_epoch, _clinical_generation.get(patient_id, 0))
+
+    metrics.inc("clinical_cache_misses")
+    summary = {'Tx': [], 'Rx': [], 'Labs': []}
+    for r in conn.execute(CLINICAL_SUMMARY_QUERY, {'pid': patient_id}):
+        summary[r['section']].append((r['name'], r['value'], r['unit']))
+
+    with _clinical_cache_lock:
+        if generation != (_clinical_epoch, _clinical_generation.get(patient_id, 0)):
+            return summary   # invalidated while the query ran: may already be stale
+        _clinical_cache[patient_id] = (now, summary)
+        _clinical_cache.move_to_end(patient_id)
+        while len(_clinical_cache) > CLINICAL_CACHE_SIZE:
+            _clinical_cache.popitem(last=False)
+    return summary
+
+
+def _format_section(section, items, level):
+    if level == 'restricted':
+        return "[RESTRICTED]"
+    if not items:
+        return "None"
+    if level == 'masked':
+        return ", ".join(name for name, _, _ in items)
+    if section == 'Tx':
+        return ", ".join(f"{name} ({status})" for name, status, _ in items)
+    if section == 'Rx':
+        return ", ".join(f"{name} {dosage}" for name, dosage, _ in items)
+    return ", ".join(f"{name}: {value}{' ' + unit if unit else ''}" for name, value, unit in items)
+
+
+def format_clinical_summary(summary, role):
+    """Render the summary sections this role may see, e.g. 'Tx: ... | Rx: ... | Labs: ...'."""
+    policy = CLINICAL_SECTION_POLICY.get(role, {})
+    return " | ".join(f"{section}: {_format_section(section, summary[section], policy.get(section, 'restricted'))}"
+                      for section in ('Tx', 'Rx', 'Labs'))
+
+
 # ==========================================
 # BUSINESS LOGIC (MAC & RLS ENFORCEMENT)
 # ==========================================
 
+@metrics.timed("request_patient_data")
 def request_patient_data(user_context, patient_id_requested):
+    # The pooled reader goes back to the pool even if a query or audit write fails
+    with read_connection() as conn:
+        return patient_view(conn, user_context, patient_id_requested)
+
+
+def patient_view(conn, user_context, patient_id_requested):
+    """Apply the role (MAC) and row-level (RLS) rules to one patient record."""
     user_id = user_context['user_id']
     username = user_context['username']
     role = user_context['role_name']
     email = user_context['email']
     
-    conn = get_db()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM Patients WHERE patient_id = ?", (patient_id_requested,))
     patient = cursor.fetchone()
     
     if not patient:
-        log_audit(user_id, username, "READ_FAIL", "Patients", f"Invalid ID {patient_id_requested}")
-        conn.close()
+        log_audit(user_id, username, "READ_FAIL", "Patients", "No such patient", patient_id_requested)
         return "Error: Patient record not found."
 
     response_msg = ""
@@ -447,23 +408,33 @@ def request_patient_data(user_context, patient_id_requested):
         cursor.execute("SELECT doctor_id FROM Doctors WHERE email = ?", (email,))
         doc_record = cursor.fetchone()
         if doc_record:
-            log_audit(user_id, username, "READ_SENSITIVE", "Patients", f"Viewed full record ID {patient_id_requested}")
-            cursor.execute("SELECT description, status FROM Treatments WHERE patient_id=?", (patient_id_requested,))
-            treatments = cursor.fetchall()
-            tx_str = ", ".join([f"{t['description']}" for t in treatments]) if treatments else "None"
+            log_audit(user_id, username, "READ_SENSITIVE", "Patients", "Viewed full record", patient_id_requested)
+            clinical = format_clinical_summary(get_clinical_summary(conn, patient_id_requested), role)
             ssn_display = patient['ssn'] if patient['ssn'] else "N/A"
-            response_msg = (f"DR VIEW: {patient['first_name']} {patient['last_name']} | SSN: {ssn_display} | Tx: {tx_str}")
+            response_msg = (f"DR VIEW: {patient['first_name']} {patient['last_name']} | SSN: {ssn_display} | {clinical}")
         else:
              response_msg = "ERROR: User has Doctor role but no HR record found."
     elif role == 'nurse':
-        log_audit(user_id, username, "READ_PARTIAL", "Patients", f"Viewed masked record ID {patient_id_requested}")
+        log_audit(user_id, username, "READ_PARTIAL", "Patients", "Viewed masked record", patient_id_requested)
         if patient['ssn']:
             masked_ssn = "***-**-" + patient['ssn'][-4:]
         else:
             masked_ssn = "N/A"
-        response_msg = (f"NURSE VIEW: {patient['first_name']} {patient['last_name']} | SSN: {masked_ssn} | Tx: [RESTRICTED]")
+        clinical = format_clinical_summary(get_clinical_summary(conn, patient_id_requested), role)
+        response_msg = (f"NURSE VIEW: {patient['first_name']} {patient['last_name']} | SSN: {masked_ssn} | {clinical}")
+    elif role in ('pharmacist', 'lab_tech'):
+        # Staff link by email, like doctors: no HR record, no access
+        staff_table = 'Pharmacists' if role == 'pharmacist' else 'LabTechnicians'
+        cursor.execute(f"SELECT 1 FROM {staff_table} WHERE email = ?", (email,))
+        if cursor.fetchone():
+            log_audit(user_id, username, "READ_PARTIAL", "Patients", "Viewed clinical record", patient_id_requested)
+            clinical = format_clinical_summary(get_clinical_summary(conn, patient_id_requested), role)
+            label = "RX VIEW" if role == 'pharmacist' else "LAB VIEW"
+            response_msg = f"{label}: {patient['first_name']} {patient['last_name']} | {clinical}"
+        else:
+            response_msg = f"ERROR: User has {role} role but no HR record found."
     elif role == 'admin_db':
-        log_audit(user_id, username, "ACCESS_ATTEMPT", "Patients", "Admin accessed patient view")
+        log_audit(user_id, username, "ACCESS_ATTEMPT", "Patients", "Admin accessed patient view", patient_id_requested)
         response_msg = f"ADMIN VIEW: Patient ID {patient['patient_id']} exists. Clinical Data Access: DENIED."
 
     # ETL SERVICE — Compliance Authority New Addition just for checking everything :)
@@ -475,111 +446,138 @@ def request_patient_data(user_context, patient_id_requested):
         cursor.execute("SELECT patient_id FROM Patients WHERE email = ?", (email,))
         patient_record = cursor.fetchone()
         if patient_record and patient_record['patient_id'] == patient_id_requested:
-            log_audit(user_id, username, "READ_OWN", "Patients", f"Patient viewed own record ID {patient_id_requested}")
+            log_audit(user_id, username, "READ_OWN", "Patients", "Patient viewed own record", patient_id_requested)
             
             # Handle different possible column names
-            phone = patient.get('phone') or patient.get('phone_number') or "N/A"
-            
-            response_msg = f"YOUR RECORD: {patient['first_name']} {patient['last_name']} | Email: {patient['email']} | Phone: {phone}"
+            cols = patient.keys()
+            phone = (patient['phone'] if 'phone' in cols else None) or \
+                    (patient['phone_number'] if 'phone_number' in cols else None) or "N/A"
+            clinical = format_clinical_summary(get_clinical_summary(conn, patient_id_requested), role)
+
+            response_msg = f"YOUR RECORD: {patient['first_name']} {patient['last_name']} | Email: {patient['email']} | Phone: {phone} | {clinical}"
         else:
-            log_audit(user_id, username, "ACCESS_DENIED", "Patients", f"Patient attempted to view other record ID {patient_id_requested}")
+            log_audit(user_id, username, "ACCESS_DENIED", "Patients", "Patient attempted to view other record", patient_id_requested)
             response_msg = "ACCESS DENIED: You can only view your own medical records."
     else:
-        log_audit(user_id, username, "ACCESS_DENIED", "Patients", f"Role '{role}' attempted unauthorized read.")
+        log_audit(user_id, username, "ACCESS_DENIED", "Patients", audit_details(role=role), patient_id_requested)
         response_msg = "ACCESS DENIED: Insufficient Privileges."
 
-    conn.close()
     return response_msg
 
 # ==========================================
 # INTERFACE MODES
 # ==========================================
 
+def configure_wing(terminal=None, doors=None, host=None, port=None):
+    """Point this process at one wing: its terminal block, ward doors and server."""
+    global TERMINAL_X, TERMINAL_Y, TERMINAL_Z, DOOR_POSITIONS, MC_HOST, MC_PORT
+    if terminal:
+        TERMINAL_X, TERMINAL_Y, TERMINAL_Z = terminal
+    if doors:
+        DOOR_POSITIONS = {tuple(d) for d in doors}
+    MC_HOST = host or MC_HOST
+    MC_PORT = port or MC_PORT
+
+
 def run_minecraft_mode():
-    if not MC_AVAILABLE:
+    global loop_iterations
+    # Loaded on demand: console and scripted modes never need the mcpi client
+    try:
+        from mcpi.minecraft import Minecraft
+    except ImportError:
         print("[!] Cannot start: 'mcpi' library not installed.")
         return
     
     try:
-        mc = Minecraft.create()
+        mc = metrics.instrument(Minecraft.create(MC_HOST, MC_PORT))
         print(f"\n[SYSTEM] Minecraft Connected. Monitoring Block at {TERMINAL_X}, {TERMINAL_Y}, {TERMINAL_Z}...")
         mc.postToChat("Hospital Security Online.")
         mc.postToChat("Type 'REGISTER' in chat to sign up!")
         
         while True:
-            # Check for chat messages (for registration)
-            chat_posts = mc.events.pollChatPosts()
-            for post in chat_posts:
-                #player_name = post.entityId  # In some versions this is the player name or ID
-                #message = post.message
-
-                entity_id = post.entityId
-                player_name = mc.entity.getName(entity_id)
-                message = post.message
-
-                # Handle registration flow
-                if message.lower().strip() == 'register' and player_name not in mc_registration_state:
-                    # Check if already registered
-                    user_context = get_user_credentials(player_name)
-                    if not user_context:
-                        mc.postToChat(f"{player_name}: Starting registration...")
-                        mc.postToChat("Do you want to register as a patient? (Type 'yes' or 'no')")
-                        mc_registration_state[player_name] = {'step': 0, 'data': {}}
-                    else:
-                        mc.postToChat(f"{player_name}: Already registered! Hit the terminal.")
-                
-                # Process ongoing registration
-                elif player_name in mc_registration_state:
-                    process_minecraft_registration(mc, player_name, message)
-            
-            # Check for block hits (terminal access)
-            hits = mc.events.pollBlockHits()
-            for hit in hits:
-                print(f"[DEBUG] Block hit at: {hit.pos.x}, {hit.pos.y}, {hit.pos.z}")
-                if (TERMINAL_X - 1 <= hit.pos.x <= TERMINAL_X + 1) and \
-                   (TERMINAL_Z - 1 <= hit.pos.z <= TERMINAL_Z + 1):
-                    
-                    player_name = mc.entity.getName(hit.entityId)
-                    user_context = get_user_credentials(player_name)
-                    
-                    if user_context:
-                        # User exists - show their info
-                        role = user_context['role_name']
-                        mc.postToChat(f"Greetings {player_name}! Role: {role}")
-                        
-                        result = request_patient_data(user_context, 1) 
-                        mc.postToChat(result)
-                        print(f"[MC] Data sent to {player_name} ({role})")
-                    else:
-                        # User not found - prompt registration
-                        mc.postToChat(f"User '{player_name}' not registered.")
-                        mc.postToChat("Type 'REGISTER' in chat to sign up!")
-                        print(f"[!] Unregistered player: {player_name}")
-                
-                # ---- PHYSICAL DOOR (MAC ZONE) ----
-                # ---- PHYSICAL DOOR (MAC ZONE) ----
-                if (
-                    (hit.pos.x == DOOR_X  and hit.pos.y == DOOR_Y  and hit.pos.z == DOOR_Z) or
-                    (hit.pos.x == DOOR2_X and hit.pos.y == DOOR2_Y and hit.pos.z == DOOR2_Z)
-                ):
-
-                    player_name = mc.entity.getName(hit.entityId)
-                    user_ctx = get_user_credentials(player_name)
-
-                    if not user_ctx:
-                        mc.postToChat("🚫 You must be registered to enter this ward.")
+            with metrics.timer("loop_iteration"):
+                # Check for chat messages (for registration)
+                chat_posts = mc.events.pollChatPosts()
+                for post in chat_posts:
+                    #player_name = post.entityId  # In some versions this is the player name or ID
+                    #message = post.message
+
+                    entity_id = post.entityId
+                    player_name = mc.entity.getName(entity_id)
+                    message = post.message
+
+                    if not rate_limit.allow(player_name, 'chat'):
+                        metrics.inc("throttled_hits")
                         continue
 
-                    if not enforce_physical_door_access(mc, user_ctx, hit.pos):
-                        log_audit(user_ctx['user_id'], player_name, "PHYSICAL_DENY", "WardDoor", "Blocked from ward")
+                    # Handle registration flow
+                    if message.lower().strip() == 'register' and player_name not in mc_registration_state:
+                        # Check if already registered
+                        user_context = get_user_credentials(player_name)
+                        if not user_context:
+                            mc.postToChat(f"{player_name}: Starting registration...")
+                            mc.postToChat("Do you want to register as a patient? (Type 'yes' or 'no')")
+                            mc_registration_state[player_name] = {'step': 0, 'data': {}}
+                        else:
+                            mc.postToChat(f"{player_name}: Already registered! Hit the terminal.")
+
+                    # Process ongoing registration
+                    elif player_name in mc_registration_state:
+                        process_minecraft_registration(mc, player_name, message)
+
+                # Check for block hits (terminal access)
+                hits = mc.events.pollBlockHits()
+                for hit in hits:
+                    metrics.inc("block_hits")
+                    metrics.sampled_debug("block_hit", f"Block hit at: {hit.pos.x}, {hit.pos.y}, {hit.pos.z}")
+                    if (TERMINAL_X - 1 <= hit.pos.x <= TERMINAL_X + 1) and \
+                       (TERMINAL_Z - 1 <= hit.pos.z <= TERMINAL_Z + 1):
+
+                        player_name = mc.entity.getName(hit.entityId)
+                        if not rate_limit.allow(player_name, 'terminal'):
+                            metrics.inc("throttled_hits")
+                            continue
+                        user_context = get_user_credentials(player_name)
+
+                        if user_context:
+                            # User exists - show their info
+                            role = user_context['role_name']
+                            mc.postToChat(f"Greetings {player_name}! Role: {role}")
+
+                            result = request_patient_data(user_context, 1) 
+                            mc.postToChat(result)
+                            print(f"[MC] Data sent to {player_name} ({role})")
+                        else:
+                            # User not found - prompt registration
+                            mc.postToChat(f"User '{player_name}' not registered.")
+                            mc.postToChat("Type 'REGISTER' in chat to sign up!")
+                            print(f"[!] Unregistered player: {player_name}")
+
+                    # ---- PHYSICAL DOOR (MAC ZONE) ----
+                    # ---- PHYSICAL DOOR (MAC ZONE) ----
+                    if (hit.pos.x, hit.pos.y, hit.pos.z) in DOOR_POSITIONS:
+
+                        player_name = mc.entity.getName(hit.entityId)
+                        if not rate_limit.allow(player_name, 'door'):
+                            metrics.inc("throttled_hits")
+                            continue
+                        user_ctx = get_user_credentials(player_name)
+
+                        if not user_ctx:
+                            mc.postToChat("🚫 You must be registered to enter this ward.")
+                            continue
+
+                        if not enforce_physical_door_access(mc, user_ctx, hit.pos):
+                            log_audit(user_ctx['user_id'], player_name, "PHYSICAL_DENY", "WardDoor", "Blocked from ward")
+                            continue
+
+
+                        log_audit(user_ctx['user_id'], player_name, "PHYSICAL_GRANT", "WardDoor", "Entered ward")
                         continue
 
 
-                    log_audit(user_ctx['user_id'], player_name, "PHYSICAL_GRANT", "WardDoor", "Entered ward")
-                    continue
 
-
-            
+            loop_iterations += 1
             time.sleep(0.2)
     except Exception as e:
         print(f"[MC ERROR] {e}")
@@ -593,7 +591,13 @@ def run_console_simulation_mode():
         print("-" * 30)
         username_input = input("Enter Username (or 'q' to exit): ").strip()
         if username_input.lower() == 'q': break
-        
+
+        # Brute-force throttle: the attempt is reserved before the account is even
+        # looked up, and only given back after a successful login
+        if not rate_limit.allow(username_input, 'login'):
+            print("[!] Too many failed attempts. Please try again later.")
+            continue
+
         user_context = get_user_credentials(username_input)
         if not user_context:
             print(f"[!] User '{username_input}' not found in system.")
@@ -609,13 +613,17 @@ def run_console_simulation_mode():
             continue
             
         password_input = input(f"Enter Password for {username_input}: ").strip()
-        if hash_password(password_input) == user_context['password_hash']:
+        status, auth_context = authenticate(username_input, password_input)
+        if status == "ok":
+            rate_limit.refund(username_input, 'login')
+            user_context = auth_context
             # Greeting with Role
             role = user_context['role_name']
             print(f"\n[+] Greetings {user_context['full_name']}! Your role is: {role}")
             
             while True:
                 if role == 'admin_db':
+                    from hospital_admin import admin_create_user, admin_delete_user
                     print("   1) Create User")
                     print("   2) Delete User")
                     print("   3) Logout")
@@ -633,22 +641,90 @@ def run_console_simulation_mode():
                     if not cmd.isdigit(): 
                         print("   [!] Please enter a valid Patient ID number.")
                         continue
+                    if not rate_limit.allow(username_input, 'console', role):
+                        print("   [!] Too many requests. Please slow down.")
+                        continue
 
                     print(f"   [*] Verifying Access Policies...")
                     result = request_patient_data(user_context, int(cmd))
                     print(f"   >> RESPONSE: {result}\n")
-
-                if cmd.lower() == 'logout': break
-                if not cmd.isdigit(): 
-                    print("   [!] Please enter a valid Patient ID number.")
-                    continue
-                
-                print(f"   [*] Verifying Access Policies...")
-                result = request_patient_data(user_context, int(cmd))
-                print(f"   >> RESPONSE: {result}\n")
         else:
             print(f"[!] AUTH FAILED: Invalid Password.")
-            log_audit(user_context['user_id'], username_input, "LOGIN_FAIL", "Users", "Invalid password")
+
+
+def parse_script_line(line):
+    """Accept either a JSON object or a CSV line: user,password,action[,patient_id]."""
+    line = line.strip()
+    if line.startswith('{'):
+        rec = json.loads(line)
+        text = lambda key, default='': default if rec.get(key) is None else str(rec[key])
+        return text('user'), text('password'), text('action', 'read'), rec.get('patient_id')
+    fields = next(csv.reader([line]))
+    fields += [''] * (4 - len(fields))
+    return fields[0].strip(), fields[1].strip(), (fields[2].strip() or 'read'), (fields[3].strip() or None)
+
+
+def run_script_record(username, password, action, patient_id):
+    """Run one scripted request through the same authentication and policy path
+    as the console. Returns (status, result)."""
+    if not rate_limit.allow(username, 'login'):
+        return "throttled", "Too many failed attempts. Please try again later."
+    status, user_context = authenticate(username, password)
+    if status == "unknown_user":
+        return status, f"User '{username}' not found in system."
+    if status == "auth_failed":
+        return status, "Invalid password"
+    rate_limit.refund(username, 'login')
+
+    if action == 'login':
+        return "ok", f"Authenticated as {user_context['role_name']}"
+    if action != 'read':
+        return "unsupported", f"Action '{action}' is not available in scripted mode"
+    if not str(patient_id or '').isdigit():
+        return "bad_request", "Please enter a valid Patient ID number."
+
+    result = request_patient_data(user_context, int(patient_id))
+    return read_status(result), result
+
+
+def read_status(result):
+    """Classify a request_patient_data() result as 'ok', 'denied' or 'error'."""
+    if result.startswith("ACCESS DENIED"):
+        return "denied"
+    if result.upper().startswith("ERROR"):
+        return "error"
+    return "ok"
+
+
+def run_scripted_mode(stream, out=sys.stdout):
+    """Non-interactive driver: one (user, password, action, patient_id) record per
+    line in, one JSON result per line out. A throughput summary goes to stderr."""
+    count = 0
+    start = time.perf_counter()
+    for line_no, line in enumerate(stream, start=1):
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+        t0 = time.perf_counter()
+        username, action, patient_id = None, None, None
+        try:
+            username, password, action, patient_id = parse_script_line(line)
+            status, result = run_script_record(username, password, action, patient_id)
+        except Exception as e:
+            # One bad record must not end the replay; keep whatever was parsed
+            status, result = "error", str(e)
+        out.write(json.dumps({
+            'line': line_no, 'user': username, 'action': action,
+            'patient_id': int(patient_id) if str(patient_id).isdigit() else patient_id,
+            'status': status, 'result': result,
+            'elapsed_ms': round((time.perf_counter() - t0) * 1000, 3),
+        }) + "\n")
+        count += 1
+
+    rate_limit.flush(force=True)   # one audit record per throttled burst
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed else 0.0
+    print(f"[SCRIPT] {count} records in {elapsed:.2f}s ({rate:.1f} req/s)", file=sys.stderr)
+    return count
 
 # ==========================================
 # DOOR SECTION
@@ -687,15 +763,25 @@ def enforce_physical_door_access(mc, user_ctx, pos):
 # ==========================================
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Hospital security middleware")
+    parser.add_argument("--script", metavar="FILE",
+                        help="Run scripted requests from FILE ('-' for stdin) without a TTY")
+    args = parser.parse_args()
+
+    if args.script:
+        if args.script == '-':
+            run_scripted_mode(sys.stdin)
+        else:
+            with open(args.script, encoding='utf-8') as script:
+                run_scripted_mode(script)
+        sys.exit(0)
+
     print("--- HOSPITAL SECURITY MIDDLEWARE ---")
     
-    # Check database schema on startup
-    print("\n[SYSTEM] Checking database schema...")
-    patient_cols = get_table_columns("Patients")
-    if patient_cols:
-        print(f"[OK] Patients table columns: {', '.join(patient_cols)}")
-    else:
-        print("[ERROR] Could not read Patients table schema")
+    # Check the database exists without opening a connection on startup
+    if not os.path.exists(DB_PATH):
+        print(f"[ERROR] Database not found: {DB_PATH}")
         sys.exit(1)
     
     print("\nSelect Mode:")
@@ -704,6 +790,19 @@ if __name__ == "__main__":
     
     choice = input("\nSelect (1/2): ").strip()
     
+    # Metrics endpoint and periodic summary (only when HOSPITAL_METRICS=1)
+    metrics.start()
+
+    # Move cold audit rows into monthly archive files in the background
+    import audit_archive
+    audit_archive.start_archiver()
+
+    # Evict idle rate-limit keys and audit throttled bursts
+    rate_limit.start_sweeper()
+
+    # Invalidate cached clinical summaries whenever any process changes them
+    start_cache_invalidation()
+
     if choice == '1':
         run_minecraft_mode()
     elif choice == '2':
@@ -0,0 +1,362 @@
+import os
+import sys
+import stat
+import json
+import time
+import asyncio
+import secrets
+import sqlite3
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import rate_limit
+from hospital_core import DB_PATH, READ_POOL_SIZE, authenticate, log_audit, audit_details, ensure_audit_schema
+from hospital_middleware import request_patient_data, read_status, start_cache_invalidation
+from audit_archive import query_audit_range
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# Local request/response service for ward tablets and the dashboard. Clients
+# send one JSON object per line and get one JSON object per line back, tagged
+# with the request's "id" (responses on one connection may come back out of
+# order). Every patient read goes through request_patient_data, so the same
+# role (MAC) and row-level (RLS) rules and audit records apply as in-game.
+SOCKET_PATH = 'hospital_service.sock'
+TCP_HOST = '127.0.0.1'
+TCP_PORT = 8765
+
+EXECUTOR_WORKERS = READ_POOL_SIZE * 2   # threads running blocking SQLite calls
+MAX_PENDING = 256          # requests admitted server-wide; further ones wait
+PER_CLIENT_LIMIT = 8       # in-flight requests per connection before we stop reading it
+MAX_LINE = 64 * 1024       # bytes per request line
+MAX_BATCH = 100            # patient ids per batch_read
+AUDIT_QUERY_LIMIT = 1000   # rows per audit_query
+SESSION_TTL = 900          # seconds a login token stays valid
+SESSION_SWEEP = 60         # seconds between expired-session sweeps
+
+AUDIT_ROLES = ('auditor', 'etl_service')
+
+_executor = None
+_admission = None
+_sessions = {}             # token -> (user_context, expires_at); event loop thread only
+
+
+def blocking(func, *args):
+    """Run a blocking (SQLite) call on the bounded executor."""
+    return asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+
+
+def session_context(req):
+    token = req.get('token')
+    entry = _sessions.get(token) if isinstance(token, str) else None
+    if entry is None:
+        return None
+    if entry[1] < time.monotonic():
+        del _sessions[token]
+        return None
+    return entry[0]
+
+
+def drop_user_sessions(user_id=None):
+    """End the sessions of one user (or everyone) after their account, role or
+    roles change, so a stale role or row-level scope is never used again."""
+    for token in [t for t, (ctx, _) in _sessions.items() if user_id is None or ctx['user_id'] == user_id]:
+        del _sessions[token]
+
+
+def watch_account_changes(loop):
+    # change_bus calls back on its listener thread; sessions live on the event loop
+    import change_bus
+    change_bus.subscribe('Users', lambda change: loop.call_soon_threadsafe(drop_user_sessions, change.key))
+    change_bus.subscribe('UserRoles', lambda change: loop.call_soon_threadsafe(drop_user_sessions, change.key))
+    change_bus.subscribe('Roles', lambda change: loop.call_soon_threadsafe(drop_user_sessions))
+
+
+async def sweep_sessions(interval=SESSION_SWEEP):
+    while True:
+        await asyncio.sleep(interval)
+        now = time.monotonic()
+        for token in [t for t, (_, expires) in _sessions.items() if expires < now]:
+            del _sessions[token]
+
+
+def optional_str(req, key):
+    """Value of an optional string field. Raises ValueError if it is present but not a string."""
+    value = req.get(key)
+    if value is not None and not isinstance(value, str):
+        raise ValueError(f"{key} must be a string")
+    return value
+
+
+def parse_patient_id(value):
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
+
+
+# ==========================================
+# OPERATIONS
+# ==========================================
+# Each operation takes the decoded request and returns (status, result).
+# Status values match scripted mode: ok, auth_failed, throttled, unauthenticated,
+# unsupported, bad_request, denied, error. Unlike scripted mode, login never
+# reports unknown_user.
+
+THROTTLED = ("throttled", "Too many requests. Please slow down.")
+
+
+async def op_login(req):
+    username, password = optional_str(req, 'user') or '', optional_str(req, 'password') or ''
+    # Reserve the attempt before authenticating; only a successful login gets it back
+    if not rate_limit.allow(username, 'login'):
+        return "throttled", "Too many failed attempts. Please try again later."
+    status, user_context = await blocking(authenticate, username, password)
+    if status != "ok":
+        # One answer for unknown users and wrong passwords, so logins cannot probe for accounts
+        return "auth_failed", "Invalid username or password"
+    rate_limit.refund(username, 'login')
+    token = secrets.token_urlsafe(32)
+    _sessions[token] = (user_context, time.monotonic() + SESSION_TTL)
+    return "ok", {'token': token, 'role': user_context['role_name'], 'expires_in': SESSION_TTL}
+
+
+async def op_logout(req):
+    token = optional_str(req, 'token')
+    if token:
+        _sessions.pop(token, None)
+    return "ok", "Logged out"
+
+
+async def op_read(req):
+    user_context = session_context(req)
+    if user_context is None:
+        return "unauthenticated", "Login required"
+    patient_id = parse_patient_id(req.get('patient_id'))
+    if patient_id is None:
+        return "bad_request", "Please enter a valid Patient ID number."
+    if not rate_limit.allow(user_context['username'], 'service', user_context['role_name']):
+        return THROTTLED
+    result = await blocking(request_patient_data, user_context, patient_id)
+    return read_status(result), result
+
+
+def read_many(user_context, patient_ids):
+    results = []
+    for patient_id in patient_ids:
+        result = request_patient_data(user_context, patient_id)
+        results.append({'patient_id': patient_id, 'status': read_status(result), 'result': result})
+    return results
+
+
+async def op_batch_read(req):
+    user_context = session_context(req)
+    if user_context is None:
+        return "unauthenticated", "Login required"
+    raw_ids = req.get('patient_ids')
+    if not isinstance(raw_ids, list) or not raw_ids:
+        return "bad_request", "patient_ids must be a non-empty list"
+    if len(raw_ids) > MAX_BATCH:
+        return "bad_request", f"At most {MAX_BATCH} patient ids per batch"
+    patient_ids = [parse_patient_id(p) for p in raw_ids]
+    if None in patient_ids:
+        return "bad_request", "Please enter valid Patient ID numbers."
+    if not rate_limit.allow(user_context['username'], 'service', user_context['role_name'], len(patient_ids)):
+        return THROTTLED
+    # One executor job per batch, so a large batch cannot crowd out other clients
+    return "ok", await blocking(read_many, user_context, patient_ids)
+
+
+def run_audit_query(user_context, start, end, user_id, patient_id, action, limit):
+    clauses, params = ["1=1"], []
+    if user_id is not None:
+        clauses.append("user_id = ?")
+        params.append(user_id)
+    if patient_id is not None:
+        clauses.append("patient_id = ?")   # idx_audit_patient
+        params.append(patient_id)
+    if action:
+        clauses.append("action = ?")
+        params.append(action)
+
+    rows = query_audit_range(start, end, " AND ".join(clauses), params)
+    try:
+        result = [{'log_id': r['log_id'], 'user_id': r['user_id'], 'action': r['action'],
+                   'table_name': r['table_name'], 'patient_id': r['patient_id'],
+                   'timestamp': r['timestamp'], 'details': r['details']}
+                  for r in itertools.islice(rows, limit)]
+    finally:
+        rows.close()
+
+    log_audit(user_context['user_id'], user_context['username'], "AUDIT_QUERY", "AuditLogs",
+              audit_details(start=start, end=end, rows=len(result)))
+    return result
+
+
+async def op_audit_query(req):
+    user_context = session_context(req)
+    if user_context is None:
+        return "unauthenticated", "Login required"
+    if user_context['role_name'] not in AUDIT_ROLES:
+        await blocking(log_audit, user_context['user_id'], user_context['username'],
+                       "ACCESS_DENIED", "AuditLogs", audit_details(role=user_context['role_name']))
+        return "denied", "ACCESS DENIED: Only auditor or etl_service may query the audit log."
+
+    user_id, patient_id = req.get('user_id'), req.get('patient_id')
+    if user_id is not None and parse_patient_id(user_id) is None:
+        return "bad_request", "user_id must be an integer"
+    if patient_id is not None and parse_patient_id(patient_id) is None:
+        return "bad_request", "patient_id must be an integer"
+    limit = req.get('limit', 100)
+    if not isinstance(limit, int) or not 0 < limit <= AUDIT_QUERY_LIMIT:
+        return "bad_request", f"limit must be between 1 and {AUDIT_QUERY_LIMIT}"
+    start, end, action = optional_str(req, 'start'), optional_str(req, 'end'), optional_str(req, 'action')
+
+    rows = await blocking(run_audit_query, user_context, start, end,
+                          None if user_id is None else int(user_id),
+                          None if patient_id is None else int(patient_id), action, limit)
+    return "ok", rows
+
+
+OPERATIONS = {
+    'login':       op_login,
+    'logout':      op_logout,
+    'read':        op_read,
+    'batch_read':  op_batch_read,
+    'audit_query': op_audit_query,
+}
+
+
+# ==========================================
+# CONNECTION HANDLING
+# ==========================================
+
+async def dispatch(line):
+    try:
+        req = json.loads(line)
+    except ValueError:
+        req = None
+    if not isinstance(req, dict):
+        return {'id': None, 'status': "bad_request", 'result': "Request must be a JSON object"}
+
+    op = req.get('op')
+    handler = OPERATIONS.get(op) if isinstance(op, str) else None
+    if handler is None:
+        return {'id': req.get('id'), 'status': "unsupported", 'result': f"Unknown op '{op}'"}
+
+    # Global admission: past MAX_PENDING, requests queue here instead of piling
+    # more work onto the executor and the database.
+    async with _admission:
+        with metrics.timer(f"service_{op}"):
+            try:
+                status, result = await handler(req)
+            except ValueError as e:
+                status, result = "bad_request", str(e)
+            except sqlite3.Error as e:
+                status, result = "error", f"ERROR: {e}"
+            except Exception as e:
+                # Never leave the client waiting: every request gets a response
+                print(f"[SERVICE ERROR] {op}: {e!r}")
+                status, result = "error", "ERROR: Internal error"
+    return {'id': req.get('id'), 'status': status, 'result': result}
+
+
+async def serve_request(line, writer, slots):
+    try:
+        response = await dispatch(line)
+        writer.write((json.dumps(response) + "\n").encode())
+        await writer.drain()
+    except ConnectionError:
+        pass
+    except Exception as e:
+        print(f"[SERVICE ERROR] {e}")
+    finally:
+        slots.release()
+
+
+async def handle_client(reader, writer):
+    # Per-client limit: once PER_CLIENT_LIMIT requests are in flight we stop
+    # reading this connection, so a fast client is slowed by its own socket
+    # buffer instead of growing our queues.
+    slots = asyncio.Semaphore(PER_CLIENT_LIMIT)
+    pending = set()
+    try:
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                writer.write(b'{"id": null, "status": "bad_request", "result": "Request line too long"}\n')
+                break
+            except ConnectionError:
+                break
+            if not line:
+                break
+            if not line.strip():
+                continue
+            await slots.acquire()
+            task = asyncio.create_task(serve_request(line, writer, slots))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def serve(socket_path=SOCKET_PATH, host=None, port=TCP_PORT):
+    global _executor, _admission
+    _executor = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS, thread_name_prefix="service-db")
+    _admission = asyncio.Semaphore(MAX_PENDING)
+
+    if host or not hasattr(asyncio, 'start_unix_server'):
+        host = host or TCP_HOST
+        server = await asyncio.start_server(handle_client, host, port, limit=MAX_LINE, backlog=1024)
+        where = f"{host}:{port}"
+    else:
+        # Remove a socket left over from a previous run, but never a regular file
+        if os.path.exists(socket_path) and stat.S_ISSOCK(os.stat(socket_path).st_mode):
+            os.unlink(socket_path)
+        server = await asyncio.start_unix_server(handle_client, socket_path, limit=MAX_LINE, backlog=1024)
+        os.chmod(socket_path, 0o660)
+        where = socket_path
+
+    watch_account_changes(asyncio.get_running_loop())
+    sweeper = asyncio.create_task(sweep_sessions())
+    print(f"[SERVICE] Listening on {where} ({EXECUTOR_WORKERS} DB threads, "
+          f"{MAX_PENDING} pending max, {PER_CLIENT_LIMIT} per client)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        sweeper.cancel()
+        _executor.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Hospital local service (JSON lines)")
+    parser.add_argument("--socket", default=SOCKET_PATH, help="Unix socket path")
+    parser.add_argument("--tcp", action="store_true", help=f"Listen on {TCP_HOST} instead of a Unix socket")
+    parser.add_argument("--port", type=int, default=TCP_PORT)
+    args = parser.parse_args()
+
+    if not os.path.exists(DB_PATH):
+        print(f"[ERROR] Database not found: {DB_PATH}")
+        sys.exit(1)
+
+    ensure_audit_schema()
+    metrics.start()
+    start_cache_invalidation()
+    rate_limit.start_sweeper()
+
+    try:
+        asyncio.run(serve(args.socket, TCP_HOST if args.tcp else None, args.port))
+    except KeyboardInterrupt:
+        print("\n[SERVICE] Stopped.")
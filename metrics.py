@@ -0,0 +1,273 @@
+import os
+import time
+import threading
+from functools import wraps
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# Instrumentation is decided once at import time so that, when it is off,
+# decorated functions are returned untouched and cost nothing extra.
+ENABLED = os.environ.get("HOSPITAL_METRICS", "0") == "1"
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = int(os.environ.get("HOSPITAL_METRICS_PORT", "9108"))
+SUMMARY_INTERVAL = 60        # seconds between console summaries
+DEBUG_SAMPLE_EVERY = 50      # print 1 of every N sampled debug lines
+
+# Latency buckets in seconds (upper bounds, Prometheus style)
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+_registry_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_sample_counts = {}
+
+
+# ==========================================
+# METRIC TYPES
+# ==========================================
+
+class Histogram:
+    """Fixed-size latency histogram: one counter per bucket plus sum and count."""
+    __slots__ = ('name', 'counts', 'sum', 'count', 'lock')
+
+    def __init__(self, name):
+        self.name = name
+        self.counts = [0] * (len(BUCKETS) + 1)   # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        i = 0
+        while i < len(BUCKETS) and seconds > BUCKETS[i]:
+            i += 1
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += seconds
+            self.count += 1
+
+
+class Counter:
+    __slots__ = ('name', 'value', 'lock')
+
+    def __init__(self, name):
+        self.name = name
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+def histogram(name):
+    h = _histograms.get(name)
+    if h is None:
+        with _registry_lock:
+            h = _histograms.setdefault(name, Histogram(name))
+    return h
+
+
+def counter(name):
+    c = _counters.get(name)
+    if c is None:
+        with _registry_lock:
+            c = _counters.setdefault(name, Counter(name))
+    return c
+
+
+def inc(name, amount=1):
+    if ENABLED:
+        counter(name).inc(amount)
+
+
+# ==========================================
+# INSTRUMENTATION HELPERS
+# ==========================================
+
+def timed(name):
+    """Decorator recording call latency and error count under `name`."""
+    def decorator(func):
+        if not ENABLED:
+            return func
+        hist = histogram(name)
+        errors = counter(f"{name}_errors")
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                hist.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class _Timer:
+    __slots__ = ('hist', 'start')
+
+    def __init__(self, hist):
+        self.hist = hist
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(name):
+    """Context manager timing a block, e.g. one polling loop iteration."""
+    if not ENABLED:
+        return _NULL_TIMER
+    return _Timer(histogram(name))
+
+
+class _InstrumentedProxy:
+    """Wraps the Minecraft connection so every API call is timed as mc_<method>.
+    Sub-objects such as mc.events and mc.entity are wrapped recursively."""
+
+    def __init__(self, target, prefix):
+        self._target = target
+        self._prefix = prefix
+
+    def __getattr__(self, attr):
+        value = getattr(self._target, attr)
+        name = f"{self._prefix}_{attr}"
+        if callable(value):
+            return timed(name)(value)
+        if hasattr(value, '__dict__'):
+            return _InstrumentedProxy(value, name)
+        return value
+
+
+def instrument(obj, prefix="mc"):
+    return _InstrumentedProxy(obj, prefix) if ENABLED else obj
+
+
+def sampled_debug(key, message, every=DEBUG_SAMPLE_EVERY):
+    """Print a debug line only once every `every` calls for the same key."""
+    n = _sample_counts.get(key, 0) + 1
+    _sample_counts[key] = n
+    if n % every == 1 or every == 1:
+        print(f"[DEBUG] {message} (sampled 1/{every}, seen {n})")
+
+
+# ==========================================
+# EXPORT (PROMETHEUS TEXT + CONSOLE SUMMARY)
+# ==========================================
+
+def render_prometheus():
+    lines = []
+    for name, h in sorted(_histograms.items()):
+        metric = f"hospital_{name}_seconds"
+        with h.lock:
+            counts, total, count = list(h.counts), h.sum, h.count
+        lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound, c in zip(BUCKETS, counts):
+            cumulative += c
+            lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{metric}_bucket{{le="+Inf"}} {count}')
+        lines.append(f"{metric}_sum {total:.6f}")
+        lines.append(f"{metric}_count {count}")
+    for name, c in sorted(_counters.items()):
+        metric = f"hospital_{name}_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {c.value}")
+    return "\n".join(lines) + "\n"
+
+
+def percentile(h, q):
+    """Approximate a percentile from bucket bounds (upper bound of the bucket holding it)."""
+    if h.count == 0:
+        return 0.0
+    target = q * h.count
+    cumulative = 0
+    for bound, c in zip(BUCKETS, h.counts):
+        cumulative += c
+        if cumulative >= target:
+            return bound
+    return float('inf')
+
+
+def print_summary():
+    print("\n" + "=" * 60)
+    print("      MIDDLEWARE METRICS SUMMARY      ")
+    print("=" * 60)
+    print(f"{'Metric':<28} | {'Count':>7} | {'Avg ms':>8} | {'p95 ms':>8}")
+    print("-" * 60)
+    for name, h in sorted(_histograms.items()):
+        if not h.count:
+            continue
+        avg = h.sum / h.count * 1000
+        p95 = percentile(h, 0.95) * 1000
+        print(f"{name:<28} | {h.count:>7} | {avg:>8.2f} | {p95:>8.2f}")
+    for name, c in sorted(_counters.items()):
+        if c.value:
+            print(f"{name:<28} | {c.value:>7} |")
+    print("=" * 60)
+
+
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    # http.server is imported here so that importing metrics stays cheap
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass  # keep the console for middleware output
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"[METRICS] Serving http://{host}:{port}/metrics")
+    return server
+
+
+def start_summary_printer(interval=SUMMARY_INTERVAL):
+    def loop():
+        while True:
+            time.sleep(interval)
+            print_summary()
+    threading.Thread(target=loop, daemon=True).start()
+
+
+def start():
+    """Start the HTTP endpoint and periodic summary if instrumentation is enabled."""
+    if not ENABLED:
+        return
+    try:
+        start_metrics_server()
+    except OSError as e:
+        print(f"[METRICS] Could not start endpoint: {e}")
+    start_summary_printer()
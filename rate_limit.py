@@ -0,0 +1,159 @@
+import time
+import atexit
+import threading
+from collections import OrderedDict
+
+from hospital_core import AuditEvent, audit_details, log_audit_batch
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# In-memory token buckets keyed by (player, role, zone). Checks never touch the
+# database: a throttled hit is rejected straight away, and each throttled burst
+# is written to the audit log once (by the sweeper) rather than once per hit.
+# `role` is only known to callers that already hold a session (console after
+# login, the local service); Minecraft hits arrive before any lookup and use None.
+
+# zone -> (burst capacity, tokens refilled per second)
+ZONE_LIMITS = {
+    'terminal': (5, 1.0),
+    'door':     (5, 1.0),
+    'chat':     (10, 2.0),
+    'login':    (5, 1 / 30),   # failed logins: 5 at once, then one per 30 s
+    'console':  (20, 5.0),
+    'service':  (50, 20.0),
+}
+# (role, zone) overrides
+ROLE_LIMITS = {
+    ('auditor', 'service'):     (100, 50.0),
+    ('etl_service', 'service'): (500, 200.0),
+}
+DEFAULT_LIMIT = (10, 2.0)
+
+IDLE_TTL = 300             # seconds without hits before a key is dropped (its bucket is full by then)
+MAX_KEYS = 100000          # hard cap; the least recently used key goes first
+BURST_GAP = 5              # seconds without throttled hits that close a burst
+SWEEP_INTERVAL = 5         # seconds between sweeps (eviction + burst audit records)
+
+
+class Bucket:
+    """One key's state: a handful of numbers, whatever the hit rate."""
+    __slots__ = ('tokens', 'stamp', 'capacity', 'rate', 'rejected', 'burst_start', 'last_reject')
+
+    def __init__(self, capacity, rate, now):
+        self.tokens = float(capacity)
+        self.stamp = now
+        self.capacity = capacity
+        self.rate = rate
+        self.rejected = 0
+        self.burst_start = 0.0
+        self.last_reject = 0.0
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+
+_buckets = OrderedDict()   # key -> Bucket, least recently hit first
+_lock = threading.Lock()
+_closed_bursts = []        # (key, rejected, seconds) waiting to be audited
+
+
+def limits_for(role, zone):
+    return ROLE_LIMITS.get((role, zone)) or ZONE_LIMITS.get(zone, DEFAULT_LIMIT)
+
+
+def _bucket(key, now):
+    bucket = _buckets.get(key)
+    if bucket is None:
+        bucket = _buckets[key] = Bucket(*limits_for(key[1], key[2]), now)
+        if len(_buckets) > MAX_KEYS:
+            _evict(*_buckets.popitem(last=False))
+    else:
+        _buckets.move_to_end(key)
+        bucket.refill(now)
+    return bucket
+
+
+def _reject(bucket, now):
+    if not bucket.rejected:
+        bucket.burst_start = now
+    bucket.rejected += 1
+    bucket.last_reject = now
+
+
+def _evict(key, bucket):
+    if bucket.rejected:
+        _closed_bursts.append((key, bucket.rejected, bucket.last_reject - bucket.burst_start))
+
+
+# ==========================================
+# CHECKS (no database access)
+# ==========================================
+
+def allow(player, zone, role=None, cost=1):
+    """Take `cost` tokens from the (player, role, zone) bucket. Returns False,
+    and counts the hit towards the current burst, if there are not enough."""
+    now = time.monotonic()
+    with _lock:
+        bucket = _bucket((player, role, zone), now)
+        if bucket.tokens >= cost:
+            bucket.tokens -= cost
+            return True
+        _reject(bucket, now)
+        return False
+
+
+def refund(player, zone, role=None, cost=1):
+    """Give back tokens taken by allow(). To only count failures (e.g. wrong
+    passwords), reserve with allow() before the attempt and refund on success:
+    concurrent attempts then cannot all slip past a bucket that holds one token."""
+    with _lock:
+        bucket = _bucket((player, role, zone), time.monotonic())
+        bucket.tokens = min(bucket.capacity, bucket.tokens + cost)
+
+
+# ==========================================
+# SWEEPER (EVICTION + AGGREGATED AUDIT)
+# ==========================================
+
+def sweep(now=None, force=False):
+    """Drop idle keys and close finished bursts. Returns the closed bursts as
+    (key, rejected hits, seconds); `force` closes every open burst."""
+    now = time.monotonic() if now is None else now
+    with _lock:
+        while _buckets:
+            key, bucket = next(iter(_buckets.items()))
+            if now - bucket.stamp < IDLE_TTL:
+                break
+            del _buckets[key]
+            _evict(key, bucket)
+        for key, bucket in _buckets.items():
+            if bucket.rejected and (force or now - bucket.last_reject >= BURST_GAP):
+                _evict(key, bucket)
+                bucket.rejected = 0
+        closed = _closed_bursts[:]
+        del _closed_bursts[:]
+    return closed
+
+
+def flush(force=False):
+    """Write one THROTTLED audit record per closed burst."""
+    closed = sweep(force=force)
+    log_audit_batch(AuditEvent(None, "THROTTLED", "RateLimit",
+                               audit_details(player=player, role=role, zone=zone,
+                                             rejected=rejected, seconds=round(seconds)))
+                    for (player, role, zone), rejected, seconds in closed)
+    return len(closed)
+
+
+def start_sweeper(interval=SWEEP_INTERVAL):
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                flush()
+            except Exception as e:
+                print(f"[RATE LIMIT ERROR] {e}")
+    threading.Thread(target=loop, daemon=True).start()
+    atexit.register(flush, True)
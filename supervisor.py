@@ -0,0 +1,240 @@
+import os
+import sys
+import json
+import time
+import queue
+import threading
+import multiprocessing
+
+# Hit, throttle and latency figures in the health reports come from metrics,
+# so enable it for workers unless the operator turned it off. Liveness does
+# not depend on it: workers report hospital_middleware.loop_iterations.
+os.environ.setdefault("HOSPITAL_METRICS", "1")
+
+import metrics
+import rate_limit
+from hospital_core import DB_PATH, ensure_audit_schema, load_audit_key
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# One worker process per hospital wing (or Minecraft server), all sharing
+# hospital_mc.db. Each worker owns its mcpi connection, terminal and doors.
+# Workers coordinate writes through SQLite's lock with busy-timeout, retry and
+# backoff (see hospital_core.write_transaction), and keep their clinical
+# caches coherent through the change_bus ChangeLog table.
+WINGS = {
+    'main': {'host': 'localhost', 'port': 4711,
+             'terminal': [76, 11, 48], 'doors': [[106, 11, 38], [106, 11, 37]]},
+    # 'east': {'host': 'localhost', 'port': 4712,
+    #          'terminal': [12, 11, 80], 'doors': [[40, 11, 70]]},
+}
+
+HEARTBEAT_INTERVAL = 5       # seconds between worker health reports
+STALL_TIMEOUT = 30           # seconds without a loop iteration before a worker is restarted
+RESTART_BACKOFF = 1          # seconds before the first restart, doubled per crash
+RESTART_BACKOFF_MAX = 60
+STABLE_AFTER = 120           # seconds of uptime that reset the backoff
+HEALTH_INTERVAL = 30         # seconds between health summaries
+HEALTH_FILE = 'supervisor_health.json'
+SUPERVISE_INTERVAL = 0.5
+
+
+# ==========================================
+# WORKER PROCESS
+# ==========================================
+
+def worker_stats(wing):
+    import hospital_middleware
+    loop = metrics.histogram("loop_iteration")
+    return {
+        'wing': wing,
+        'pid': os.getpid(),
+        'time': time.time(),
+        'iterations': hospital_middleware.loop_iterations,
+        'metrics': metrics.ENABLED,
+        'loop_p95_ms': metrics.percentile(loop, 0.95) * 1000,
+        'block_hits': metrics.counter("block_hits").value,
+        'throttled_hits': metrics.counter("throttled_hits").value,
+        'write_busy_retries': metrics.counter("write_busy_retries").value,
+    }
+
+
+def report_health(wing, health, interval=HEARTBEAT_INTERVAL):
+    while True:
+        try:
+            health.put_nowait(worker_stats(wing))
+        except queue.Full:
+            pass
+        time.sleep(interval)
+
+
+def run_worker(wing, config, health):
+    """Entry point of one worker process: run the Minecraft loop for one wing."""
+    import hospital_middleware
+    hospital_middleware.configure_wing(config.get('terminal'), config.get('doors'),
+                                       config.get('host'), config.get('port'))
+    hospital_middleware.start_cache_invalidation()
+    rate_limit.start_sweeper()
+    threading.Thread(target=report_health, args=(wing, health), daemon=True).start()
+    print(f"[WORKER {wing}] pid {os.getpid()} -> {hospital_middleware.MC_HOST}:{hospital_middleware.MC_PORT}")
+    hospital_middleware.run_minecraft_mode()
+
+
+# ==========================================
+# SUPERVISOR
+# ==========================================
+
+def prepare_shared_state():
+    """One-time setup that workers would otherwise race on: audit schema and
+    triggers, the checkpoint key file and the ChangeLog triggers."""
+    import change_bus
+    ensure_audit_schema()
+    load_audit_key()
+    change_bus.install()
+
+
+def start_worker(ctx, wing, slot, health):
+    process = ctx.Process(target=run_worker, args=(wing, slot['config'], health),
+                          name=f"wing-{wing}", daemon=True)
+    process.start()
+    now = time.monotonic()
+    slot.update(process=process, started=now, progress_at=now, iterations=0)
+    print(f"[SUPERVISOR] Started wing '{wing}' (pid {process.pid})")
+
+
+def check_worker(wing, slot, now):
+    """Reap a dead or stalled worker and schedule its restart with backoff."""
+    process = slot['process']
+    if process.is_alive() and now - slot['progress_at'] < STALL_TIMEOUT:
+        if now - slot['started'] >= STABLE_AFTER:
+            slot['backoff'] = RESTART_BACKOFF
+        return
+
+    if process.is_alive():
+        print(f"[SUPERVISOR] Wing '{wing}' stalled for {STALL_TIMEOUT}s, restarting")
+        process.terminate()
+    process.join(5)
+    print(f"[SUPERVISOR] Wing '{wing}' exited (code {process.exitcode}), restart in {slot['backoff']}s")
+    slot.update(process=None, next_start=now + slot['backoff'], restarts=slot['restarts'] + 1)
+    slot['backoff'] = min(slot['backoff'] * 2, RESTART_BACKOFF_MAX)
+
+
+def aggregate_health(slots):
+    now = time.monotonic()
+    wings = {}
+    for wing, slot in slots.items():
+        process = slot['process']
+        stats = dict(slot['stats'])
+        stats.update(
+            status="running" if process and process.is_alive() else "restarting",
+            pid=process.pid if process else None,
+            restarts=slot['restarts'],
+            stalled_for=round(now - slot['progress_at'], 1) if process else None,
+        )
+        wings[wing] = stats
+
+    totals = {k: sum(w.get(k, 0) for w in wings.values())
+              for k in ('iterations', 'block_hits', 'throttled_hits', 'write_busy_retries', 'restarts')}
+    totals['running'] = sum(w['status'] == "running" for w in wings.values())
+    totals['wings'] = len(wings)
+    return {'time': time.time(), 'totals': totals, 'wings': wings}
+
+
+def print_health(report):
+    print("\n" + "=" * 84)
+    print(f"{'Wing':<10} | {'Status':<10} | {'PID':>7} | {'Restarts':>8} | {'Loops':>8} | "
+          f"{'Hits':>6} | {'Throttled':>9} | {'Busy':>5}")
+    print("-" * 84)
+    for wing, w in report['wings'].items():
+        print(f"{wing:<10} | {w['status']:<10} | {w['pid'] or '-':>7} | {w['restarts']:>8} | "
+              f"{w.get('iterations', 0):>8} | {w.get('block_hits', 0):>6} | "
+              f"{w.get('throttled_hits', 0):>9} | {w.get('write_busy_retries', 0):>5}")
+    t = report['totals']
+    print("-" * 84)
+    print(f"{'TOTAL':<10} | {t['running']}/{t['wings']} up{'':<4} | {'':>7} | {t['restarts']:>8} | "
+          f"{t['iterations']:>8} | {t['block_hits']:>6} | {t['throttled_hits']:>9} | {t['write_busy_retries']:>5}")
+    print("=" * 84)
+
+
+def write_health(report, path=HEALTH_FILE):
+    tmp = path + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp, path)
+
+
+def supervise(wings=WINGS):
+    # spawn: workers start clean instead of inheriting the supervisor's SQLite handles
+    ctx = multiprocessing.get_context("spawn")
+    health = ctx.Queue(maxsize=1000)
+    slots = {wing: {'config': config, 'process': None, 'next_start': 0.0, 'started': 0.0,
+                    'progress_at': 0.0, 'iterations': 0, 'restarts': 0,
+                    'backoff': RESTART_BACKOFF, 'stats': {}}
+             for wing, config in wings.items()}
+    next_report = time.monotonic() + HEALTH_INTERVAL
+
+    try:
+        while True:
+            now = time.monotonic()
+            while True:
+                try:
+                    stats = health.get_nowait()
+                except queue.Empty:
+                    break
+                slot = slots.get(stats['wing'])
+                if not slot or not slot['process'] or slot['process'].pid != stats['pid']:
+                    continue   # late report from a worker that was already replaced
+                slot['stats'] = stats
+                if stats['iterations'] != slot['iterations']:
+                    slot['iterations'] = stats['iterations']
+                    slot['progress_at'] = now
+
+            for wing, slot in slots.items():
+                if slot['process'] is not None:
+                    check_worker(wing, slot, now)
+                elif now >= slot['next_start']:
+                    start_worker(ctx, wing, slot, health)
+
+            if now >= next_report:
+                report = aggregate_health(slots)
+                print_health(report)
+                write_health(report)
+                next_report = now + HEALTH_INTERVAL
+            time.sleep(SUPERVISE_INTERVAL)
+    finally:
+        for slot in slots.values():
+            if slot['process'] is not None and slot['process'].is_alive():
+                slot['process'].terminate()
+        for slot in slots.values():
+            if slot['process'] is not None:
+                slot['process'].join(5)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Run one middleware worker per hospital wing")
+    parser.add_argument("--config", metavar="FILE",
+                        help="JSON file mapping wing name -> {host, port, terminal, doors}")
+    args = parser.parse_args()
+
+    if not os.path.exists(DB_PATH):
+        print(f"[ERROR] Database not found: {DB_PATH}")
+        sys.exit(1)
+
+    wings = WINGS
+    if args.config:
+        with open(args.config, encoding='utf-8') as f:
+            wings = json.load(f)
+
+    prepare_shared_state()
+
+    # Archival runs once here rather than in every worker
+    import audit_archive
+    audit_archive.start_archiver()
+
+    print(f"[SUPERVISOR] Launching {len(wings)} wing worker(s): {', '.join(wings)}")
+    try:
+        supervise(wings)
+    except KeyboardInterrupt:
+        print("\n[SUPERVISOR] Stopped.")